@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, abort, current_app, Response, request
+from flask import Flask, render_template, request, redirect, url_for, flash, abort, current_app, request, jsonify
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_migrate import Migrate
 from models import db, Project, User, NDARequest, CallbackRequest, AUM_CHOICES
@@ -7,14 +7,39 @@ from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, TextAreaField, FloatField, IntegerField, SubmitField, PasswordField, SelectField, Form, SelectMultipleField, HiddenField, BooleanField
 from wtforms.validators import DataRequired, Email, EqualTo, NumberRange, Optional, Length, ValidationError
 from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import or_, func, desc
+from sqlalchemy import or_, func, desc, select
 from flask_admin import Admin, AdminIndexView, expose
 from flask_admin.menu import MenuLink
 from flask_admin.contrib.sqla import ModelView
 from forms import ProfileForm
+import search_index
+import listing
+import facets
+import cache
+import matching
+import exports
+import dashboard
+import user_cache
+import passwords
+import attachments
+import derivatives
+import extraction
+import resumable
+import jobs
+import notifications  # registers its job handlers
+import digest
+import page_cache
+import assets
+import db_engine
+import query_plans
+import sql_timing
+import metrics
+import slow_queries
+import profiler
 import os
+import click
 
 
 AUM_LABELS = dict(AUM_CHOICES)
@@ -43,9 +68,38 @@ else:
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+app.config['SEARCH_PAGE_SIZE'] = int(os.environ.get('SEARCH_PAGE_SIZE', 20))
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', passwords.DEFAULT_METHOD)
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+# "x-sendfile" or "x-accel" to let the front proxy stream attachment bytes
+app.config['ATTACHMENT_SENDFILE'] = os.environ.get('ATTACHMENT_SENDFILE') or None
+app.config['ATTACHMENT_ACCEL_PREFIX'] = os.environ.get('ATTACHMENT_ACCEL_PREFIX', '/_attachments/')
+app.config['PREVIEW_WORKERS'] = int(os.environ.get('PREVIEW_WORKERS', 1))
+# resumable uploads (resumable.py): chunks stay under MAX_CONTENT_LENGTH, files can be bigger
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', resumable.DEFAULT_CHUNK_SIZE))
+app.config['UPLOAD_MAX_SIZE'] = int(os.environ.get('UPLOAD_MAX_SIZE', resumable.DEFAULT_MAX_SIZE))
+# outgoing mail (outbox.py); without MAIL_SERVER messages land in instance/outbox/
+for _key in ('MAIL_SERVER', 'MAIL_PORT', 'MAIL_USERNAME', 'MAIL_PASSWORD', 'MAIL_FROM', 'NOTIFY_EMAILS'):
+    if os.environ.get(_key):
+        app.config[_key] = os.environ[_key]
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', '').lower() in ('1', 'true', 'yes')
+app.config['SITE_URL'] = os.environ.get('SITE_URL', 'http://localhost:5000')  # for links in emails
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN') or None  # bearer token for /metrics
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', 'admin')  # "all", "admin" or "" (off)
+app.config['SLOW_QUERY_MS'] = int(os.environ.get('SLOW_QUERY_MS', 200))  # 0 turns the slow-query log off
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01))  # of search/export requests
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+db_engine.init_app(app)
+metrics.init_app(app)
 db.init_app(app)
+sql_timing.init_app(app)
+slow_queries.init_app(app)
+profiler.init_app(app)
+cache.init_app(app)
+passwords.init_app(app)
+page_cache.init_app(app)
+assets.init_app(app)
 
 # Flask-Login setup
 login_manager = LoginManager()
@@ -53,7 +107,7 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'  # Redirect to login if not auth'd
 login_manager.login_message = 'Login required to access this page.'
 
-class SecureModelView(ModelView):
+class AdminOnly:
     def is_accessible(self):
         return (current_user.is_authenticated and getattr(current_user, 'role', '') == 'admin')
 
@@ -61,15 +115,50 @@ class SecureModelView(ModelView):
         flash("Admin area — please log in with an admin account.", "warning")
         return redirect(url_for('login', next=request.url))
 
+class SecureModelView(AdminOnly, ModelView):
+    pass
+
+class ProfilesAdmin(AdminOnly, profiler.ProfilesView):
+    pass
+
 class UserAdmin(SecureModelView):
     form_columns = ['email','role','first_name','surname','company_name','position_in_company',
                     'company_website','company_address','phone','aum','is_verified','track_record','geo_focus']
 
+    def after_model_change(self, form, model, is_created):
+        user_cache.invalidate(model.id)
+        matching.refresh_investor(model.id)
+
+    def after_model_delete(self, model):
+        user_cache.invalidate(model.id)
+
 class ProjectAdmin(SecureModelView):
     form_columns = ['title','description','timeline','exit_strategy','project_type','budget','funding',
                     'duration','irr','location','location_type','risk_level','secured','developer_tr',
                     'website','preapproved_facility','brand_partnership','MOIC_EM','sponsor_equity',
-                    'attachment_path','user_id']
+                    'attachment_path','attachment_name','user_id']
+
+    def on_model_change(self, form, model, is_created):
+        attachments.track(model)
+
+    def after_model_change(self, form, model, is_created):
+        project_changed(model)
+
+    def on_model_delete(self, model):
+        matching.remove_project(model.id)
+        attachments.release(model.attachment_path)
+
+    def after_model_delete(self, model):
+        project_changed(model, deleted=True)
+
+def project_changed(project, deleted=False):
+    # Refresh anything derived from the project catalogue. Call after commit.
+    facets.invalidate()
+    if not deleted:
+        matching.refresh_project(project.id)
+        derivatives.schedule(project.attachment_path)
+        extraction.schedule(project.attachment_path)
+        db.session.commit()  # the preview/text jobs
 
 # register these:
 admin = Admin(app, name="")
@@ -77,11 +166,15 @@ admin.add_view(UserAdmin(User, db.session))
 admin.add_view(ProjectAdmin(Project, db.session))
 admin.add_view(SecureModelView(NDARequest, db.session))
 admin.add_view(SecureModelView(CallbackRequest, db.session))
+admin.add_view(ProfilesAdmin(name="Profiles", endpoint="profiles"))
 admin.add_link(MenuLink(name='Back to Site', url='/'))
 
 migrate = Migrate(app, db)
 
 class SearchForm(FlaskForm):
+    class Meta:
+        csrf = False  # read-only GET form; filters live in the URL
+
     query = StringField("Query", validators=[Optional()])
     countries = SelectMultipleField("Countries", validators=[Optional()], coerce=str)
     location_type = SelectField(
@@ -95,7 +188,8 @@ class SearchForm(FlaskForm):
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    # cached snapshot; the full User row loads only if a view needs it
+    return user_cache.load(user_id)
 
 
 # Forms
@@ -165,6 +259,7 @@ class ProjectForm(FlaskForm):
     attachment = FileField('Upload Attachment (PDF, XLSX, etc.)', validators=[
         FileAllowed({'pdf', 'xlsx', 'xls', 'docx', 'txt', 'png', 'jpg', 'jpeg'}, 'Invalid file type!')
     ])  # FileRequired() if mandatory
+    upload_id = HiddenField(validators=[Optional()])  # finished resumable upload, if any
     submit = SubmitField('Upload Project')
 
 
@@ -194,20 +289,38 @@ def gate_unverified_investors():
 
 
 
+def recommended_deals():
+    # Precomputed matches for verified investors; one indexed query
+    if (current_user.is_authenticated
+        and getattr(current_user, "role", "") == "investor"
+        and getattr(current_user, "is_verified", False)):
+        return matching.recommended(current_user.id)
+    return []
+
+
 # Routes
+def _personal_home():
+    # verified investors see their own recommendations on the home page
+    return (current_user.is_authenticated and current_user.role == "investor"
+            and current_user.is_verified)
+
 @app.route("/")
+@page_cache.cached(skip=_personal_home)
 def home():
-    return render_template("home.html")
+    return render_template("home.html", recommended=recommended_deals())
 
 @app.route('/about')
+@page_cache.cached()
 def about():
     return render_template('about.html')
 
 @app.route('/contact')
+@page_cache.cached()
 def contact():
     return render_template('contact.html')
 
 @app.route('/faq')
+@page_cache.cached()
 def faq():
     return render_template('faq.html')
 
@@ -244,11 +357,17 @@ def register():
             flash("Please select AUM for investors.", "warning")
             return render_template("register.html", form=form)
 
+        try:
+            password_hash = passwords.hash_password(form.password.data)
+        except passwords.HashingBusy:
+            flash("We're a little busy right now — please try again in a moment.", "warning")
+            return render_template("register.html", form=form)
+
         user = User(
             first_name=(form.first_name.data or None),
             surname=(form.surname.data or None),
             email=form.email.data.lower().strip(),
-            password_hash=generate_password_hash(form.password.data),
+            password_hash=password_hash,
             role=form.role.data,
             company_name=(form.company_name.data or None),
             position_in_company=(form.position_in_company.data or None),
@@ -299,19 +418,23 @@ def profile():
         current_user.track_record = form.track_record.data
         current_user.geo_focus    = form.geo_focus.data
 
-        # Preferences in JSON
-        prefs = current_user.get_preferences()
-        prefs.update({
+        # Typed preference columns
+        current_user.target_min_irr = form.target_min_irr.data
+        current_user.ticket_min = form.ticket_min.data
+        current_user.ticket_max = form.ticket_max.data
+        if form.email_updates.data and not current_user.email_updates:
+            current_user.digest_through = None  # (re)subscribing: start from today's deals
+        current_user.email_updates = form.email_updates.data
+
+        # Free-text preferences stay in JSON (partial update in SQL)
+        current_user.patch_preferences({
             "preferred_asset_classes": form.preferred_asset_classes.data or "",
             "location_type_preference": form.location_type_preference.data or "",
-            "target_min_irr": form.target_min_irr.data or "",
-            "ticket_min": form.ticket_min.data or "",
-            "ticket_max": form.ticket_max.data or "",
-            "email_updates": bool(form.email_updates.data),
         })
-        current_user.set_preferences(prefs)
 
         db.session.commit()
+        user_cache.invalidate(current_user.id)
+        matching.refresh_investor(current_user.id)
         flash("Profile updated.", "success")
         return redirect(url_for('profile'))
 
@@ -329,13 +452,12 @@ def profile():
         form.track_record.data = current_user.track_record
         form.geo_focus.data    = current_user.geo_focus
 
-        prefs = current_user.get_preferences()
-        form.preferred_asset_classes.data = prefs.get("preferred_asset_classes", "")
-        form.location_type_preference.data = prefs.get("location_type_preference", "")
-        form.target_min_irr.data = prefs.get("target_min_irr", "")
-        form.ticket_min.data = prefs.get("ticket_min", "")
-        form.ticket_max.data = prefs.get("ticket_max", "")
-        form.email_updates.data = bool(prefs.get("email_updates", False))
+        form.preferred_asset_classes.data = current_user.preferred_asset_classes
+        form.location_type_preference.data = current_user.location_type_preference
+        form.target_min_irr.data = current_user.target_min_irr
+        form.ticket_min.data = current_user.ticket_min
+        form.ticket_max.data = current_user.ticket_max
+        form.email_updates.data = bool(current_user.email_updates)
 
     return render_template('profile.html', form=form)
 
@@ -349,7 +471,13 @@ def login():
         user = User.query.filter(
             db.func.lower(User.email) == form.email.data.lower()
         ).first()
-        if user and user.check_password(form.password.data):
+        try:
+            ok = user is not None and passwords.verify(user, form.password.data)
+        except passwords.HashingBusy:
+            flash("We're a little busy right now — please try again in a moment.", "warning")
+            return render_template('login.html', form=form)
+        if ok:
+            db.session.commit()  # persists an upgraded hash, if any
             login_user(user)
             flash('Login successful!')
             return redirect(url_for('home'))
@@ -397,19 +525,45 @@ def upload():
             secured=form.secured.data,
             user_id=current_user.id
         )
-        if form.attachment.data and allowed_file(form.attachment.data.filename):
-            filename = secure_filename(form.attachment.data.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            form.attachment.data.save(filepath)
-            project.attachment_path = filename
+        if not attach_from_form(form, project):
+            return render_template('upload.html', form=form)
         db.session.add(project)
         db.session.commit()
+        project_changed(project)
         flash('Project uploaded successfully!')
         return redirect(url_for('search'))
     return render_template('upload.html', form=form)
 
 
 
+def attach_from_form(form, project):
+    # Attach the form's file -- a finished resumable upload or a plain file
+    # field -- to project. Returns False (after flashing) if it can't be used.
+    # No autoflush: a dirty project would otherwise take the write lock while
+    # the file is hashed and moved.
+    with db.session.no_autoflush:
+        return _attach_from_form(form, project)
+
+
+def _attach_from_form(form, project):
+    if form.upload_id.data:
+        try:
+            key, name = resumable.claim(form.upload_id.data, current_user.id)
+        except resumable.UploadError as e:
+            flash(f"Attachment upload failed ({e}); please upload the file again.", "danger")
+            return False
+        project.attachment_path, project.attachment_name = key, name
+    elif form.attachment.data and getattr(form.attachment.data, "filename", None):
+        if not allowed_file(form.attachment.data.filename):
+            return True
+        project.attachment_path = attachments.store(form.attachment.data)
+        project.attachment_name = secure_filename(form.attachment.data.filename)
+    else:
+        return True
+    attachments.track(project)
+    return True
+
+
 @app.route("/projects/<int:project_id>/edit", methods=["GET", "POST"])
 @login_required
 def edit_project(project_id):
@@ -446,15 +600,12 @@ def edit_project(project_id):
         project.MOIC_EM = form.MOIC_EM.data
         project.sponsor_equity = form.sponsor_equity.data
 
-        if form.attachment.data and hasattr(form.attachment.data, "filename") and form.attachment.data.filename:
-            if allowed_file(form.attachment.data.filename):
-                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                filename = secure_filename(form.attachment.data.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                form.attachment.data.save(filepath)
-                project.attachment_path = filename
+        if not attach_from_form(form, project):
+            db.session.rollback()
+            return render_template("upload.html", form=form, edit_mode=True, project=project)
 
         db.session.commit()
+        project_changed(project)
         flash("Project updated", "success")
         return redirect(url_for("project_detail", project_id=project.id))
 
@@ -473,12 +624,55 @@ def project_detail(project_id):
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    name = secure_filename(request.args.get("name", "")) or None
+    return attachments.send(filename, name)
+
+# Resumable uploads. JSON bodies and the X-Chunk-SHA256 header both force a
+# CORS preflight, which is what keeps these safe without a CSRF token.
+@app.route('/upload-sessions', methods=['POST'])
+@login_required
+def upload_session_create():
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify(error="expected a JSON body"), 400
+    if not allowed_file(data.get("filename") or ""):
+        return jsonify(error="file type not allowed"), 400
+    try:
+        sess = resumable.create(current_user.id, data.get("filename"), data.get("size"), data.get("sha256"))
+    except resumable.UploadError as e:
+        return jsonify(error=str(e)), e.status
+    return jsonify(resumable.describe(sess)), 201
+
+@app.route('/upload-sessions/<session_id>')
+@login_required
+def upload_session_status(session_id):
+    try:
+        sess = resumable.status(session_id, current_user.id)
+    except resumable.UploadError as e:
+        return jsonify(error=str(e)), e.status
+    return jsonify(resumable.describe(sess))
+
+@app.route('/upload-sessions/<session_id>/<int:index>', methods=['PUT'])
+@login_required
+def upload_session_chunk(session_id, index):
+    try:
+        sess = resumable.write_chunk(session_id, current_user.id, index, request.get_data(cache=False),
+                                     request.headers.get("X-Chunk-SHA256"))
+    except resumable.UploadError as e:
+        return jsonify(error=str(e)), e.status
+    return jsonify(resumable.describe(sess))
+
+@app.route('/previews/<digest>.webp')
+def attachment_preview(digest):
+    if not attachments.is_content_key(digest):
+        abort(404)
+    return attachments.send_immutable(attachments.preview_path(digest), digest, digest + ".webp")
 
 @app.route('/search', methods=['GET', 'POST'])
 @login_required
 def search():
-    form = SearchForm()
+    # Filters travel in the query string so "next page" links are plain GETs
+    form = SearchForm(request.form if request.method == "POST" else request.args)
 
     # ---- 1) Role-aware base query -----------------------------------------
     # Developers: only their projects; everyone else: all projects
@@ -486,33 +680,24 @@ def search():
     if getattr(current_user, "role", None) == "developer":
         base_query = base_query.filter(Project.user_id == current_user.id)
 
-    # ---- 2) Build choices from the same base_query -------------------------
-    rows = (
-        base_query
-        .with_entities(Project.location)
-        .filter(Project.location.isnot(None))
-        .distinct()
-        .order_by(Project.location)
-        .all()
-    )
-    form.countries.choices = [(r[0], r[0]) for r in rows]
-    
-    query_text = ""
-    selected_countries = []
+    # ---- 2) Build choices from cached facets for the same scope -----------
+    owner_id = current_user.id if getattr(current_user, "role", None) == "developer" else None
+    facet_counts = facets.for_scope(owner_id)
+    form.countries.choices = [(v, f"{v} ({n})") for v, n in facet_counts["location"]]
+    loc_type_counts = dict(facet_counts["location_type"])
+    form.location_type.choices = [("", "Any")] + [
+        (v, f"{label} ({loc_type_counts.get(v, 0)})") for v, label in form.location_type.choices if v
+    ]
 
-    # ---- 3) Apply user filters on top of base_query ------------------------
-    if form.validate_on_submit():
-        query_text = (form.query.data or "").strip()
-        selected_countries = form.countries.data or []
+    query_text = (form.query.data or "").strip()
+    selected_countries = form.countries.data or []
+    query = base_query
+    hits = None
 
+    # ---- 3) Apply user filters on top of base_query ------------------------
+    if form.validate():
         filters = []
-        if query_text:
-            like = f"%{query_text}%"
-            filters.append(or_(
-                Project.title.ilike(like),
-                Project.description.ilike(like),
-                Project.location.ilike(like)
-            ))
+        hits = search_index.match(query_text) if query_text else None
 
         if form.irr.data:
             filters.append(Project.irr >= form.irr.data)
@@ -526,26 +711,37 @@ def search():
             filters.append(Project.location.in_(selected_countries))
 
         query = base_query.filter(*filters) if filters else base_query
-        projects = query.order_by(Project.id.desc()).all()
+
+    # ---- 4) One keyset page of lightweight result cards --------------------
+    page_size = app.config['SEARCH_PAGE_SIZE']
+    after = request.args.get("after")
+    if hits is not None:
+        # keyword search: only indexed matches, best first
+        query = query.join(hits, hits.c.project_id == Project.id)
+        projects, next_cursor = listing.page(query, after, page_size, rank=hits.c.rank, extra=(hits.c.snippet, hits.c.in_attachment))
     else:
-        # initial GET or invalid POST: keep selections if any
-        if request.method == "POST":
-            query_text = (form.query.data or "").strip()
-            selected_countries = form.countries.data or []
+        projects, next_cursor = listing.page(query, after, page_size)
 
-        projects = base_query.order_by(Project.id.desc()).all()
+    args = (request.form if request.method == "POST" else request.args).to_dict(flat=False)
+    args.pop("after", None)
+    next_url = url_for("search", after=next_cursor, **args) if next_cursor else None
+    first_url = url_for("search", **args) if after else None
 
     # keep multi-select highlighted
     form.countries.data = selected_countries
 
-    return render_template("search.html", form=form, projects=projects, query=query_text)
+    return render_template("search.html", form=form, projects=projects, query=query_text,
+                           keyword=hits is not None, next_url=next_url, first_url=first_url,
+                           facet_counts=facet_counts, recommended=recommended_deals())
 
 
 @app.route("/eligibility")
+@page_cache.cached()
 def eligibility():
     return render_template("eligibility.html")
 
 @app.route("/disclaimer")
+@page_cache.cached()
 def disclaimer():
     return render_template("disclaimer.html")
 
@@ -564,10 +760,9 @@ def nda_request():
         if request.method == "GET":
             if hasattr(current_user, "company_name") and current_user.company_name:
                 form.company.data = current_user.company_name
-            if hasattr(current_user, "first_name") and hasattr(current_user, "surname"):
-                full_name = f"{current_user.first_name or ''} {current_user.surname or ''}".strip()
-                if full_name:
-                    form.contact_name.data = full_name
+            full_name = getattr(current_user, "display_name", "")
+            if full_name and full_name != current_user.email:
+                form.contact_name.data = full_name
             if hasattr(current_user, "email") and current_user.email:
                 form.contact_email.data = current_user.email
     except Exception:
@@ -584,9 +779,9 @@ def nda_request():
             message=form.message.data or None
         )
         db.session.add(req)
+        db.session.flush()  # need the id for the job
+        jobs.enqueue("notify.nda_request", {"id": req.id}, key=f"nda_request:{req.id}")
         db.session.commit()
-        # If you have email integration later, trigger it here.
-        # e.g. send to admin/dev team.
 
         flash("Thanks — your NDA request has been received. We’ll follow up shortly.", "success")
 
@@ -612,8 +807,6 @@ def request_callback():
         email = request.form.get("email")
         message = request.form.get("message")
 
-        # Log or handle the data (later can save to DB or email)
-        # app.logger.info(f"Callback request: {name} | {company} | {email} | {phone} | {message}")
         new_request = CallbackRequest(
         name=name,
         company=company,
@@ -622,6 +815,8 @@ def request_callback():
         message=message
         )
         db.session.add(new_request)
+        db.session.flush()  # need the id for the job
+        jobs.enqueue("notify.callback_request", {"id": new_request.id}, key=f"callback_request:{new_request.id}")
         db.session.commit()
 
         flash("Thank you — our team will contact you shortly.", "success")
@@ -638,48 +833,30 @@ def admin_dashboard():
         flash("Admin only.", "warning")
         return redirect(url_for("home"))
 
-    # --- Aggregates / counts ---
-    users_count = db.session.query(func.count(User.id)).scalar()
-    projects_count = db.session.query(func.count(Project.id)).scalar()
+    # counts in one round trip + four small "recent" queries, cached briefly
+    return render_template("admin_dashboard.html", password_stats=passwords.stats(),
+                           job_stats=jobs.stats(), **dashboard.stats())
 
-    # If CallbackRequest model exists; otherwise set to 0
-    try:
-        callbacks_count = db.session.query(func.count(CallbackRequest.id)).scalar()
-    except Exception:
-        callbacks_count = 0
 
-    # If NDARequest model exists; otherwise set to 0
-    try:
-        nDAs_count = db.session.query(func.count(NDARequest.id)).scalar()
-    except Exception:
-        nDAs_count = 0
+@app.route("/admin-dashboard/slow-queries")
+@login_required
+def admin_slow_queries():
+    if getattr(current_user, "role", "") != "admin":
+        flash("Admin only.", "warning")
+        return redirect(url_for("home"))
 
+    return render_template("admin_slow_queries.html", shapes=slow_queries.summary(),
+                           recent=slow_queries.recent()[:50],
+                           threshold=app.config["SLOW_QUERY_MS"])
 
-    # --- Recent items (top 10) ---
-    recent_users = User.query.order_by(desc(User.id)).limit(10).all()
-    recent_projects = Project.query.order_by(desc(Project.id)).limit(10).all()
-    try:
-        recent_callbacks = CallbackRequest.query.order_by(desc(CallbackRequest.timestamp)).limit(10).all()
-    except Exception:
-        recent_callbacks = []
-        
-    
-    try:
-        recent_NDA_Requests = NDARequest.query.order_by(desc(NDARequest.created_at)).limit(10).all()
-    except Exception:
-        recent_NDA_Requests = []
-
-
-    return render_template(
-        "admin_dashboard.html",
-        users_count=users_count,
-        projects_count=projects_count,
-        callbacks_count=callbacks_count,
-        nDAs_count=nDAs_count,
-        recent_users=recent_users,
-        recent_projects=recent_projects,
-        recent_callbacks=recent_callbacks,
-        recent_NDA_Requests=recent_NDA_Requests,
+
+def _export(name, header, stmt, transforms=None):
+    # ?format=jsonl for JSON lines, ?gzip=1 to compress on the fly
+    return exports.export_response(
+        name, header, stmt,
+        fmt=request.args.get("format", "csv"),
+        compress=request.args.get("gzip") in ("1", "true", "yes"),
+        transforms=transforms,
     )
 
 
@@ -688,46 +865,31 @@ def admin_dashboard():
 def export_users_csv():
     if getattr(current_user, "role", "") != "admin":
         abort(403)
-    rows = User.query.order_by(User.id).all()
-    def gen():
-        yield "id,email,role,first_name,surname,company_name,phone,aum\n"
-        for u in rows:
-            # yield f'{u.id},{u.email},{u.role},{u.first_name or ""},{u.surname or ""},{u.company_name or ""},{u.phone or ""},{u.aum or ""}\n'
-            label = AUM_LABELS.get(u.aum or "", "")
-            yield f'{u.id},{u.email},{u.role},{u.first_name or ""},{u.surname or ""},{u.company_name or ""},{u.phone or ""},{label}\n'
-
-    return Response(gen(), mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment; filename=users.csv"})
+    stmt = select(User.id, User.email, User.role, User.first_name, User.surname,
+                  User.company_name, User.phone, User.aum).order_by(User.id)
+    header = ["id", "email", "role", "first_name", "surname", "company_name", "phone", "aum"]
+    return _export("users", header, stmt, transforms={7: lambda v: AUM_LABELS.get(v or "", "")})
 
 @app.route("/admin-dashboard/export/projects.csv")
 @login_required
 def export_projects_csv():
     if getattr(current_user, "role", "") != "admin":
         abort(403)
-    rows = Project.query.order_by(Project.id).all()
-    def gen():
-        yield "id,title,project_type,location,budget,funding,irr,duration,owner_id\n"
-        for p in rows:
-            yield f'{p.id},"{p.title}",{p.project_type},{p.location},{p.budget},{p.funding},{p.irr},{p.duration},{p.user_id}\n'
-    return Response(gen(), mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment; filename=projects.csv"})
+    stmt = select(Project.id, Project.title, Project.project_type, Project.location, Project.budget,
+                  Project.funding, Project.irr, Project.duration, Project.user_id).order_by(Project.id)
+    header = ["id", "title", "project_type", "location", "budget", "funding", "irr", "duration", "owner_id"]
+    return _export("projects", header, stmt)
 
 @app.route("/admin-dashboard/export/callbacks.csv")
 @login_required
 def export_callbacks_csv():
     if getattr(current_user, "role", "") != "admin":
         abort(403)
-    try:
-        rows = CallbackRequest.query.order_by(CallbackRequest.timestamp.desc()).all()
-    except Exception:
-        rows = []
-    def gen():
-        yield "id,name,company,email,phone,message,timestamp\n"
-        for c in rows:
-            msg = (c.message or "").replace('\n', ' ').replace('"','""')
-            yield f'{c.id},"{c.name or ""}","{c.company or ""}",{c.email or ""},{c.phone or ""},"{msg}",{c.timestamp}\n'
-    return Response(gen(), mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment; filename=callbacks.csv"})
+    stmt = select(CallbackRequest.id, CallbackRequest.name, CallbackRequest.company, CallbackRequest.email,
+                  CallbackRequest.phone, CallbackRequest.message, CallbackRequest.timestamp
+                  ).order_by(CallbackRequest.timestamp.desc())
+    header = ["id", "name", "company", "email", "phone", "message", "timestamp"]
+    return _export("callbacks", header, stmt)
 
 
 @app.route("/admin-dashboard/export/NDAs.csv")
@@ -735,20 +897,138 @@ def export_callbacks_csv():
 def export_NDA_csv():
     if getattr(current_user, "role", "") != "admin":
         abort(403)
-    try:
-        rows = NDARequest.query.order_by(NDARequest.created_at.desc()).all()
-    except Exception:
-        rows = []
-    def gen():
-        yield "id,name,company,email,phone,message,timestamp\n"
-        for c in rows:
-            msg = (c.message or "").replace('\n', ' ').replace('"','""')
-            yield f'{c.user_id},"{c.contact_name or ""}","{c.company or ""}",{c.contact_email or ""},"{msg}",{c.created_at}\n'
-    return Response(gen(), mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment; filename=ndas.csv"})
+    stmt = select(NDARequest.id, NDARequest.user_id, NDARequest.project_id, NDARequest.contact_name,
+                  NDARequest.company, NDARequest.contact_email, NDARequest.message, NDARequest.created_at
+                  ).order_by(NDARequest.created_at.desc())
+    header = ["id", "user_id", "project_id", "name", "company", "email", "message", "timestamp"]
+    return _export("ndas", header, stmt)
+
+
+app.add_template_global(attachments.url_for_attachment, "attachment_url")
+app.add_template_global(derivatives.preview_url, "preview_url")
+
+
+@app.template_filter("highlight")
+def highlight_filter(snippet):
+    return search_index.highlight(snippet)
+
+
+@app.cli.command("search-reindex")
+def search_reindex():
+    """Create (if missing) and rebuild the project full-text index."""
+    search_index.rebuild()
+    print("Search index rebuilt.")
+
+
+@app.cli.command("match-rebuild")
+def match_rebuild():
+    """Recompute every investor's recommended deals from scratch."""
+    matching.rebuild_all()
+    print("Recommendations rebuilt.")
+
+
+@app.cli.command("password-bench")
+@click.option("--method", default=None, help="werkzeug hash method, e.g. scrypt:16384:8:1")
+@click.option("--rounds", default=5, show_default=True)
+def password_bench(method, rounds):
+    """Time password hashing to tune cost against the login latency budget."""
+    times = passwords.benchmark(method, rounds)
+    print(f"{method or app.config['PASSWORD_HASH_METHOD']}: "
+          f"min {times[0]:.1f} ms, median {times[len(times) // 2]:.1f} ms, max {times[-1]:.1f} ms")
+
+
+@app.cli.command("attachments-gc")
+@click.option("--dry-run", is_flag=True, help="List what would be deleted.")
+def attachments_gc(dry_run):
+    """Delete stored attachments no project references any more."""
+    removed = attachments.gc(dry_run=dry_run)
+    print(f"{'Would remove' if dry_run else 'Removed'} {len(removed)} attachment file(s).")
+
+
+@app.cli.command("previews-build")
+def previews_build():
+    """Render any missing attachment previews (in this process)."""
+    keys = db.session.scalars(select(Project.attachment_path).distinct()
+                              .where(Project.attachment_path.isnot(None)))
+    made, failed = derivatives.build_missing(list(keys))
+    print(f"Rendered {made} preview(s), {failed} failed.")
+
+
+@app.cli.command("text-extract")
+@click.option("--retry-failed", is_flag=True, help="Try files that failed before again.")
+def text_extract(retry_failed):
+    """Extract searchable text from attachments that don't have it yet."""
+    done, failed = extraction.extract_missing(retry_failed)
+    print(f"Extracted {done} attachment(s), {failed} failed.")
+
+
+@app.cli.command("worker")
+@click.option("--once", is_flag=True, help="Run whatever is due, then exit.")
+@click.option("--batch", default=jobs.BATCH, show_default=True)
+@click.option("--poll", default=2.0, show_default=True, help="Seconds to sleep when idle.")
+def worker(once, batch, poll):
+    """Run queued background jobs (notifications, digests, ...)."""
+    done = jobs.work(once=once, batch=batch, poll=poll)
+    print(f"Ran {done} job(s).")
+
+
+@app.cli.command("digest-send")
+@click.option("--queue", is_flag=True, help="Queue the run for 'flask worker' instead of running it here.")
+def digest_send(queue):
+    """Email new matching deals to investors who opted into updates."""
+    if queue:
+        from datetime import date
+        jobs.enqueue("digest.send", key=f"digest:{date.today().isoformat()}")
+        db.session.commit()
+        print("Digest run queued.")
+        return
+    sent, seen = digest.run()
+    print(f"Sent {sent} digest(s) to {seen} subscriber(s) with new deals to check.")
+
+
+@app.cli.command("uploads-expire")
+def uploads_expire():
+    """Remove resumable uploads that have been idle past UPLOAD_SESSION_TTL."""
+    print(f"Expired {resumable.expire()} upload session(s).")
+
+
+@app.cli.command("attachments-import")
+def attachments_import():
+    """Move flat uploads/ attachments into the content-addressed store."""
+    print(f"Moved {attachments.import_legacy()} attachment(s).")
+
+
+@app.cli.command("profile-token")
+@click.option("--mode", type=click.Choice(profiler.MODES), default="sample", show_default=True)
+def profile_token(mode):
+    """Print a token that profiles requests sending it as X-Profile."""
+    print(profiler.token(mode))
+
+
+@app.cli.command("query-plans")
+def query_plans_check():
+    """Fail if any route's SQL falls back to a full scan of a hot table."""
+    problems = query_plans.check(app)
+    for statement, found, where in problems:
+        print(f"--- {', '.join(found)}  ({where[0]}{' ...' if len(where) > 1 else ''})")
+        print(statement.strip(), end="\n\n")
+    if problems:
+        raise SystemExit(f"{len(problems)} query(ies) scan a hot table.")
+    print("No full scans of hot tables.")
+
 
+@app.cli.group("assets")
+def assets_cli():
+    """Static asset pipeline."""
 
 
+@assets_cli.command("build")
+def assets_build():
+    """Fingerprint, precompress and resize static files into static/dist/."""
+    manifest = assets.build(app)
+    variants = sum(len(v) for fmts in manifest["images"].values() for v in fmts.values())
+    print(f"Built {len(manifest['files'])} file(s) and {variants} image variant(s)"
+          f"{'' if assets.brotli else ' (no brotli installed: .gz only)'}.")
 
 
 @app.errorhandler(403)
@@ -773,4 +1053,5 @@ def allowed_file(filename):
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        search_index.rebuild()
     app.run(debug=True, use_reloader=False, threaded=True)  # As per previous fix
\ No newline at end of file
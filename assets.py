@@ -0,0 +1,243 @@
+"""Build-time static asset pipeline (``flask assets build``).
+
+The build copies everything under ``static/`` into ``static/dist/`` with a
+content hash in the name (``style.css`` -> ``dist/style.1a2b3c4d5e6f.css``),
+writes ``.gz`` (and ``.br``, when the ``brotli`` package is installed)
+siblings for text files, and renders WebP/AVIF/JPEG width variants of the
+hero images. ``url()`` references inside CSS are rewritten to the hashed
+names before the CSS itself is hashed. Everything lands in
+``dist/manifest.json``.
+
+At runtime ``url_for('static', filename=...)`` resolves through the manifest,
+and files under ``dist/`` are served with far-future immutable caching,
+picking a precompressed sibling from ``Accept-Encoding``. Without a manifest
+(or with the debug server) the original files are served as before.
+
+Config:
+    ASSETS_HERO_IMAGES  static paths that get responsive variants
+    ASSETS_HERO_WIDTHS  variant widths in px (default 640, 1024, 1536)
+"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import abort, current_app, request, url_for
+from markupsafe import Markup, escape
+from PIL import Image, features
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+try:
+    import brotli
+except ImportError:  # .gz only
+    brotli = None
+
+
+DIST = "dist"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESS = {".css", ".js", ".svg", ".json", ".txt", ".map"}
+SKIP = {".DS_Store", "Thumbs.db"}
+HERO_IMAGES = ("img/skyline.jpg", "img/hero.jpg")
+HERO_WIDTHS = (640, 1024, 1536)
+
+_manifest = {"files": {}, "images": {}}
+
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)(?!data:|https?:|//|#)([^'")]+)\1\s*\)""")
+
+
+def init_app(app):
+    app.config.setdefault("ASSETS_HERO_IMAGES", HERO_IMAGES)
+    app.config.setdefault("ASSETS_HERO_WIDTHS", HERO_WIDTHS)
+    load(app)
+    app.url_defaults(_static_defaults)
+    app.view_functions["static"] = _serve
+    app.add_template_global(picture)
+
+
+def _dist_dir(app):
+    return os.path.join(app.static_folder, DIST)
+
+
+def load(app):
+    global _manifest
+    try:
+        with open(os.path.join(_dist_dir(app), "manifest.json")) as fh:
+            _manifest = json.load(fh)
+    except FileNotFoundError:
+        _manifest = {"files": {}, "images": {}}
+
+
+def _active():
+    return _manifest["files"] and not current_app.debug
+
+
+def _static_defaults(endpoint, values):
+    if endpoint == "static" and _active():
+        name = values.get("filename")
+        values["filename"] = _manifest["files"].get(name, name)
+
+
+# ---- serving ---------------------------------------------------------------
+
+def _serve(filename):
+    """Stand-in for Flask's static view: hashed files are cached for good."""
+    if not filename.startswith(DIST + "/"):
+        return current_app.send_static_file(filename)
+    if filename == f"{DIST}/manifest.json":
+        abort(404)
+
+    path = safe_join(current_app.static_folder, filename)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encoding = None
+    if path and os.path.splitext(filename)[1] in COMPRESS:
+        for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+            if request.accept_encodings[enc] and os.path.isfile(path + ext):
+                path, encoding = path + ext, enc
+                break
+    if not path or not os.path.isfile(path):
+        return current_app.send_static_file(filename)  # the usual 404
+
+    resp = send_file(path, request.environ, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE,
+                     response_class=current_app.response_class)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    if os.path.splitext(filename)[1] in COMPRESS:
+        resp.vary.add("Accept-Encoding")
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+
+def picture(filename, alt="", sizes="100vw", **attrs):
+    """``<picture>`` with AVIF/WebP/JPEG ``srcset``s for a hero image.
+
+    Falls back to a plain ``<img>`` of the original when no variants were built.
+    """
+    extra = "".join(f' {k.rstrip("_").replace("_", "-")}="{escape(v)}"' for k, v in attrs.items())
+    variants = _manifest["images"].get(filename) if _active() else None
+    if not variants:
+        src = url_for("static", filename=filename)
+        return Markup(f'<img src="{src}" alt="{escape(alt)}"{extra}>')
+
+    def srcset(fmt):
+        return ", ".join(f'{url_for("static", filename=f)} {w}w' for w, f in variants[fmt])
+
+    sources = "".join(
+        f'<source type="image/{fmt}" srcset="{srcset(fmt)}" sizes="{escape(sizes)}">'
+        for fmt in ("avif", "webp") if fmt in variants
+    )
+    largest = url_for("static", filename=variants["jpeg"][-1][1])
+    return Markup(f'<picture>{sources}<img src="{largest}" srcset="{srcset("jpeg")}" '
+                  f'sizes="{escape(sizes)}" alt="{escape(alt)}"{extra}></picture>')
+
+
+# ---- build -----------------------------------------------------------------
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=6).hexdigest()
+
+
+def _hashed_name(rel, data, suffix=None):
+    stem, ext = os.path.splitext(rel)
+    return f"{DIST}/{stem}.{_digest(data)}{suffix or ''}{ext}"
+
+
+def _write(static, rel_out, data):
+    path = os.path.join(static, rel_out)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as fh:
+        fh.write(data)
+    os.replace(path + ".tmp", path)
+    if os.path.splitext(rel_out)[1] in COMPRESS:
+        packed = [(".gz", gzip.compress(data, 9, mtime=0))]
+        if brotli is not None:
+            packed.append((".br", brotli.compress(data, quality=11)))
+        for ext, blob in packed:
+            if len(blob) < len(data):
+                with open(path + ext, "wb") as fh:
+                    fh.write(blob)
+
+
+def _rewrite_css(rel, text, files, url_path):
+    base = os.path.dirname(rel)
+
+    def sub(m):
+        ref = m.group(2).strip()
+        target = ref.split("?", 1)[0].split("#", 1)[0]
+        if target.startswith(url_path + "/"):
+            target = target[len(url_path) + 1:]
+        elif not target.startswith("/"):
+            target = os.path.normpath(os.path.join(base, target)).replace(os.sep, "/")
+        hashed = files.get(target)
+        return f'url("{url_path}/{hashed}")' if hashed else m.group(0)
+
+    return _CSS_URL.sub(sub, text)
+
+
+def _variants(static, rel, widths):
+    """Resize ``rel`` to each width (never upscaling) in every format we can encode."""
+    formats = [("jpeg", "JPEG", ".jpg", dict(quality=80, optimize=True, progressive=True)),
+               ("webp", "WEBP", ".webp", dict(quality=75, method=6))]
+    if features.check("avif"):
+        formats.insert(0, ("avif", "AVIF", ".avif", dict(quality=55)))
+
+    out = {}
+    with Image.open(os.path.join(static, rel)) as src:
+        src = src.convert("RGB")
+        sizes = sorted({w for w in widths if w < src.width} | {min(max(widths), src.width)})
+        for width in sizes:
+            height = round(src.height * width / src.width)
+            img = src if width == src.width else src.resize((width, height), Image.LANCZOS)
+            for fmt, pil_fmt, ext, opts in formats:
+                buf = io.BytesIO()
+                img.save(buf, pil_fmt, **opts)
+                data = buf.getvalue()
+                name = _hashed_name(os.path.splitext(rel)[0] + ext, data, suffix=f".{width}w")
+                _write(static, name, data)
+                out.setdefault(fmt, []).append((width, name))
+    return out
+
+
+def build(app, clean=True):
+    """Rebuild ``static/dist``. Returns the new manifest."""
+    static = app.static_folder
+    dist = _dist_dir(app)
+    if clean and os.path.isdir(dist):
+        shutil.rmtree(dist)
+
+    sources = []
+    for dirpath, dirnames, names in os.walk(static):
+        if os.path.abspath(dirpath) == os.path.abspath(static):
+            dirnames[:] = [d for d in dirnames if d != DIST]
+        for name in sorted(names):
+            if name not in SKIP:
+                sources.append(os.path.relpath(os.path.join(dirpath, name), static).replace(os.sep, "/"))
+
+    files = {}
+    # CSS last, so its url()s can point at already-hashed names
+    for rel in sorted(sources, key=lambda r: (r.endswith(".css"), r)):
+        with open(os.path.join(static, rel), "rb") as fh:
+            data = fh.read()
+        if rel.endswith(".css"):
+            text = _rewrite_css(rel, data.decode("utf-8", "surrogateescape"), files,
+                                app.static_url_path)
+            data = text.encode("utf-8", "surrogateescape")
+        files[rel] = _hashed_name(rel, data)
+        _write(static, files[rel], data)
+
+    images = {}
+    for rel in app.config["ASSETS_HERO_IMAGES"]:
+        if rel in files:
+            images[rel] = _variants(static, rel, app.config["ASSETS_HERO_WIDTHS"])
+
+    manifest = {"files": files, "images": images}
+    with open(os.path.join(dist, "manifest.json"), "w") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    global _manifest
+    _manifest = manifest
+    return manifest
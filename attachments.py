@@ -0,0 +1,284 @@
+"""Content-addressed, deduplicating attachment store.
+
+Uploads are streamed to disk while being hashed and stored once under
+``<UPLOAD_FOLDER>/objects/ab/cd/<sha256>.<ext>``. ``Project.attachment_path``
+holds that content key; ``Project.attachment_name`` keeps the original file
+name for downloads. ``AttachmentBlob.refcount`` tracks how many projects
+point at each key so ``gc()`` can delete files nobody uses any more.
+
+Older rows may still hold a bare file name from the flat ``uploads/``
+layout; those keep working and can be moved in with ``import_legacy()``.
+
+Serving (``send()``): stored files never change, so they go out with the hash
+as a strong ETag and a year-long immutable ``Cache-Control``; conditional and
+Range requests are answered by werkzeug. Set ``ATTACHMENT_SENDFILE`` to hand
+the bytes to the front proxy instead of streaming them from the worker:
+
+    "x-sendfile"  Apache/lighttpd: ``X-Sendfile: <absolute path>``
+    "x-accel"     nginx: ``X-Accel-Redirect: <ATTACHMENT_ACCEL_PREFIX><path>``
+                  where the prefix is an ``internal`` location aliased to
+                  ``<UPLOAD_FOLDER>/`` (default "/_attachments/")
+"""
+import hashlib
+import os
+import re
+import time
+import uuid
+
+from flask import abort, current_app, request, send_from_directory, url_for
+from sqlalchemy import delete, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename, send_file as werkzeug_send_file
+
+from models import db, AttachmentBlob, AttachmentText, Project
+
+
+CHUNK = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+LEGACY_MAX_AGE = 3600  # flat files can be overwritten in place
+GC_GRACE_SECONDS = 3600  # leave fresh files alone; their row may not be committed yet
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]{1,8})?$")
+_UPSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}  # dialects with ON CONFLICT
+
+
+def is_content_key(key):
+    return bool(key and _KEY_RE.match(key))
+
+
+def _root():
+    return current_app.config["UPLOAD_FOLDER"]
+
+
+def _objects_dir():
+    return os.path.join(_root(), "objects")
+
+
+def shard_dir(key):
+    return os.path.join(_objects_dir(), key[:2], key[2:4])
+
+
+def path_for(key):
+    """Filesystem path for a stored key (content or legacy flat name)."""
+    if is_content_key(key):
+        return os.path.join(shard_dir(key), key)
+    return os.path.join(_root(), key)
+
+
+def url_for_attachment(key, name=None):
+    if not key:
+        return None
+    if name and is_content_key(key):
+        return url_for("uploaded_file", filename=key, name=name)
+    return url_for("uploaded_file", filename=key)
+
+
+def preview_path(key):
+    """Where derivatives.py puts the WebP preview for a stored key."""
+    digest = key.split(".", 1)[0]
+    return os.path.join(_root(), "derived", digest[:2], digest[2:4], digest + ".webp")
+
+
+def send(key, name=None):
+    """Response for ``/uploads/<key>``."""
+    if not is_content_key(key):
+        return send_from_directory(_root(), key, max_age=LEGACY_MAX_AGE)
+    return send_immutable(path_for(key), key.split(".", 1)[0], name or key)
+
+
+def send_immutable(path, etag, download_name):
+    """Serve a file whose content never changes for a given URL."""
+    path = os.path.abspath(path)
+    if not os.path.isfile(path):
+        abort(404)
+    mode = current_app.config.get("ATTACHMENT_SENDFILE")
+    environ = request.environ
+    if mode:
+        # the body is the proxy's to send, so Range is too: answer a plain 200
+        # (an empty 206 here would be wrong) and let it slice the file
+        environ = {k: v for k, v in environ.items() if k not in ("HTTP_RANGE", "HTTP_IF_RANGE")}
+    resp = werkzeug_send_file(
+        path, environ,
+        download_name=download_name,
+        etag=etag,
+        max_age=IMMUTABLE_MAX_AGE,
+        use_x_sendfile=bool(mode),
+        response_class=current_app.response_class,
+    )
+    if mode == "x-accel":
+        resp.headers.pop("X-Sendfile", None)
+        prefix = current_app.config.get("ATTACHMENT_ACCEL_PREFIX", "/_attachments/")
+        rel = os.path.relpath(path, os.path.abspath(_root())).replace(os.sep, "/")
+        resp.headers["X-Accel-Redirect"] = prefix + rel
+    elif not mode:
+        resp.accept_ranges = "bytes"  # pdf.js only fetches in ranges when advertised
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+
+def _ext(filename):
+    name = secure_filename(filename or "")
+    return name.rsplit(".", 1)[1].lower() if "." in name else ""
+
+
+def store(file_storage):
+    """Write an uploaded file into the store and return its content key.
+
+    The upload is copied in chunks to a temp file while hashing; identical
+    content already on disk is not written twice.
+    """
+    tmp_dir = os.path.join(_root(), "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+
+    digest = hashlib.sha256()
+    with open(tmp_path, "wb") as out:
+        while True:
+            chunk = file_storage.stream.read(CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+
+    return _file_away(tmp_path, digest.hexdigest(), file_storage.filename)
+
+
+def store_path(path, filename):
+    """Move a finished file (e.g. an assembled chunked upload) into the store.
+
+    ``path`` must be on the same filesystem as the upload folder.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return _file_away(path, digest.hexdigest(), filename)
+
+
+def _file_away(tmp_path, digest, filename):
+    ext = _ext(filename)
+    key = digest + (f".{ext}" if ext else "")
+    final = path_for(key)
+    if os.path.exists(final):
+        os.remove(tmp_path)
+        os.utime(final)  # restart gc()'s grace period; it may be unreferenced right now
+    else:
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(tmp_path, final)
+    return key
+
+
+def retain(key):
+    if not is_content_key(key):
+        return
+    size = os.path.getsize(path_for(key))
+    dialect = db.session.get_bind().dialect.name
+    if dialect in _UPSERT:
+        # one statement, so two first uploads of the same file can't both insert
+        stmt = _UPSERT[dialect](AttachmentBlob).values(key=key, size=size, refcount=1)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[AttachmentBlob.key], set_={"refcount": AttachmentBlob.refcount + 1}))
+        return
+    blob = db.session.get(AttachmentBlob, key)
+    if blob is not None:
+        blob.refcount = AttachmentBlob.refcount + 1
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(AttachmentBlob(key=key, size=size, refcount=1))
+    except IntegrityError:  # another request stored it first
+        db.session.get(AttachmentBlob, key).refcount = AttachmentBlob.refcount + 1
+
+
+def release(key):
+    if not is_content_key(key):
+        return
+    blob = db.session.get(AttachmentBlob, key)
+    if blob is not None:
+        blob.refcount = AttachmentBlob.refcount - 1
+
+
+def track(project):
+    """Adjust refcounts for a pending change to ``project.attachment_path``.
+
+    Call after assigning the new value and before the commit (it reads the
+    attribute history), from any code path that edits projects.
+    """
+    hist = inspect(project).attrs.attachment_path.history
+    for old in hist.deleted or ():
+        if old not in (hist.added or ()):
+            release(old)
+    for new in hist.added or ():
+        if new not in (hist.deleted or ()):
+            retain(new)
+
+
+def gc(dry_run=False):
+    """Delete stored files no project references. Returns removed keys."""
+    cutoff = time.time() - GC_GRACE_SECONDS
+    referenced = select(Project.id).where(Project.attachment_path == AttachmentBlob.key).exists()
+    dead = db.session.scalars(
+        select(AttachmentBlob).where(AttachmentBlob.refcount <= 0, ~referenced)
+    ).all()
+    known = set(db.session.scalars(select(AttachmentBlob.key)))
+
+    removed = []
+    for blob in dead:
+        path = path_for(blob.key)
+        if os.path.exists(path) and os.path.getmtime(path) > cutoff:
+            continue
+        removed.append(blob.key)
+        if not dry_run:
+            db.session.delete(blob)
+            for p in (path, preview_path(blob.key)):
+                if os.path.exists(p):
+                    os.remove(p)
+
+    # files whose row never got committed (e.g. a failed request)
+    for dirpath, _, files in os.walk(_objects_dir()):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            if name not in known and os.path.getmtime(path) < cutoff:
+                removed.append(name)
+                if not dry_run:
+                    os.remove(path)
+
+    if not dry_run:
+        if removed:
+            db.session.execute(delete(AttachmentText).where(AttachmentText.key.in_(removed)))
+        db.session.commit()
+    return removed
+
+
+def import_legacy():
+    """Move flat ``uploads/<name>`` attachments into the store."""
+    moved = 0
+    projects = Project.query.filter(Project.attachment_path.isnot(None)).all()
+    for project in projects:
+        old = project.attachment_path
+        if is_content_key(old):
+            continue
+        src = os.path.join(_root(), old)
+        if not os.path.isfile(src):
+            continue
+        with open(src, "rb") as fh:
+            key = store(_LocalFile(fh, old))
+        project.attachment_path = key
+        project.attachment_name = project.attachment_name or old
+        track(project)
+        db.session.flush()
+        moved += 1
+    db.session.commit()
+    return moved
+
+
+class _LocalFile:
+    # just enough of werkzeug's FileStorage for store()
+    def __init__(self, stream, filename):
+        self.stream = stream
+        self.filename = filename
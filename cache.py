@@ -0,0 +1,143 @@
+"""Tiny in-process TTL cache that can be invalidated across gunicorn workers.
+
+Each named cache keeps its entries in the worker's memory. ``clear()`` also
+rewrites a stamp file under ``instance/cache/``; every worker stats that file
+on read and drops its own entries once the stamp moves, so an edit handled by
+one worker is visible to all of them on their next request.
+
+Caches created with ``key_stamps=True`` can also drop a single entry:
+``discard(key)`` touches ``instance/cache/<name>/<key>.stamp``, and a hit is
+only served if it was stored after that key's stamp (one extra stat per hit).
+A stamp older than the TTL can't outlive any entry it would hide, so
+``discard`` deletes those, at most once per TTL per worker.
+"""
+import fcntl
+import os
+import re
+import threading
+import time
+
+
+_stamp_dir = None
+
+
+def init_app(app):
+    global _stamp_dir
+    _stamp_dir = os.path.join(app.instance_path, "cache")
+    os.makedirs(_stamp_dir, exist_ok=True)
+
+
+class TTLCache:
+    def __init__(self, name, ttl=300, maxsize=1024, key_stamps=False):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.key_stamps = key_stamps
+        self._data = {}  # key -> (stored_at, value, stored_at wall clock ns)
+        self._lock = threading.Lock()
+        self._seen_stamp = None
+        self._pruned_at = time.monotonic()
+
+    # ---- cross-worker invalidation -----------------------------------------
+    def _stamp_path(self):
+        return os.path.join(_stamp_dir, f"{self.name}.stamp") if _stamp_dir else None
+
+    def _read_stamp(self):
+        path = self._stamp_path()
+        if not path:
+            return None
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _key_stamp_path(self, key):
+        if not _stamp_dir:
+            return None
+        return os.path.join(_stamp_dir, self.name, re.sub(r"[^\w.-]", "_", str(key)) + ".stamp")
+
+    def _discarded_since(self, key, stored_ns):
+        path = self._key_stamp_path(key)
+        try:
+            return path is not None and os.stat(path).st_mtime_ns >= stored_ns
+        except FileNotFoundError:
+            return False
+
+    def _prune_key_stamps(self, directory):
+        # caller holds the directory lock, so no discard can rewrite a stamp mid-prune
+        cutoff = time.time_ns() - int(self.ttl * 1e9)
+        for entry in os.scandir(directory):
+            try:
+                if entry.name.endswith(".stamp") and entry.stat().st_mtime_ns < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        self._pruned_at = time.monotonic()
+
+    def _sync(self):
+        stamp = self._read_stamp()
+        if stamp != self._seen_stamp:
+            self._data.clear()
+            self._seen_stamp = stamp
+
+    # ---- public API ---------------------------------------------------------
+    def get(self, key, default=None):
+        with self._lock:
+            self._sync()
+            hit = self._data.get(key)
+            if hit is None or time.monotonic() - hit[0] > self.ttl:
+                return default
+            if self.key_stamps and self._discarded_since(key, hit[2]):
+                del self._data[key]
+                return default
+            return hit[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._sync()
+            if len(self._data) >= self.maxsize:
+                # drop the oldest entry; good enough for small caches
+                oldest = min(self._data, key=lambda k: self._data[k][0])
+                del self._data[oldest]
+            self._data[key] = (time.monotonic(), value, time.time_ns())
+
+    def get_or_set(self, key, fn):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = fn()
+            self.set(key, value)
+        return value
+
+    def age(self, key):
+        """Seconds since ``key`` was stored, or ``None`` if not cached."""
+        with self._lock:
+            hit = self._data.get(key)
+            return None if hit is None else time.monotonic() - hit[0]
+
+    def discard(self, key):
+        """Drop ``key`` in this worker and tell the other workers to."""
+        with self._lock:
+            self._data.pop(key, None)
+            path = self._key_stamp_path(key)
+            if path:
+                directory = os.path.dirname(path)
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, ".lock"), "w") as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX)  # against another worker's prune
+                    now = time.time_ns()
+                    with open(path, "w") as fh:
+                        fh.write(str(now))
+                    os.utime(path, ns=(now, now))  # exact, not the filesystem's coarse clock
+                    if time.monotonic() - self._pruned_at >= self.ttl:
+                        self._prune_key_stamps(directory)
+
+    def clear(self):
+        """Drop every entry in this worker and tell the other workers to."""
+        with self._lock:
+            self._data.clear()
+            path = self._stamp_path()
+            if path:
+                with open(path, "w") as fh:
+                    fh.write(str(time.time_ns()))
+                self._seen_stamp = self._read_stamp()
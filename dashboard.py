@@ -0,0 +1,94 @@
+"""Admin dashboard numbers: all counts in one round trip, cached briefly.
+
+Recent-item lists are fetched as plain column rows (safe to cache across
+requests). The cache is dropped whenever a User, Project, CallbackRequest or
+NDARequest is inserted and the transaction commits, whichever code path did
+the insert.
+"""
+import time
+
+from sqlalchemy import event, func, null, select
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from models import db, User, Project, CallbackRequest, NDARequest
+
+
+TTL_SECONDS = 60
+RECENT = 10
+WATCHED = (User, Project, CallbackRequest, NDARequest)
+
+_cache = TTLCache("dashboard", ttl=TTL_SECONDS, maxsize=1)
+
+
+def _compute():
+    counts = db.session.execute(select(
+        select(func.count(User.id)).scalar_subquery().label("users"),
+        select(func.count(Project.id)).scalar_subquery().label("projects"),
+        select(func.count(CallbackRequest.id)).scalar_subquery().label("callbacks"),
+        select(func.count(NDARequest.id)).scalar_subquery().label("ndas"),
+    )).one()
+
+    recent_users = db.session.execute(
+        select(User.id, User.email, User.role, User.first_name, User.surname,
+               User.company_name, User.phone)
+        .order_by(User.id.desc()).limit(RECENT)
+    ).all()
+    recent_projects = db.session.execute(
+        select(Project.id, Project.title, Project.project_type, Project.location,
+               Project.budget, Project.funding, Project.irr, Project.user_id)
+        .order_by(Project.id.desc()).limit(RECENT)
+    ).all()
+    recent_callbacks = db.session.execute(
+        select(CallbackRequest.id, CallbackRequest.name, CallbackRequest.company,
+               CallbackRequest.email, CallbackRequest.phone, CallbackRequest.message,
+               CallbackRequest.timestamp)
+        .order_by(CallbackRequest.timestamp.desc()).limit(RECENT)
+    ).all()
+    # labelled to the same shape as callbacks so the template can share markup
+    recent_ndas = db.session.execute(
+        select(NDARequest.id, NDARequest.contact_name.label("name"), NDARequest.company,
+               NDARequest.contact_email.label("email"), null().label("phone"),
+               NDARequest.message, NDARequest.created_at.label("timestamp"))
+        .order_by(NDARequest.created_at.desc()).limit(RECENT)
+    ).all()
+
+    return {
+        "users_count": counts.users,
+        "projects_count": counts.projects,
+        "callbacks_count": counts.callbacks,
+        "nDAs_count": counts.ndas,
+        "recent_users": recent_users,
+        "recent_projects": recent_projects,
+        "recent_callbacks": recent_callbacks,
+        "recent_NDA_Requests": recent_ndas,
+        "computed_at": time.time(),
+    }
+
+
+def stats():
+    """Template context for ``admin_dashboard.html`` plus ``cache_age`` (s)."""
+    data = dict(_cache.get_or_set("stats", _compute))
+    data["cache_age"] = int(time.time() - data["computed_at"])
+    return data
+
+
+def invalidate():
+    _cache.clear()
+
+
+@event.listens_for(Session, "after_flush")
+def _note_inserts(session, flush_context):
+    if any(isinstance(obj, WATCHED) for obj in session.new):
+        session.info["dashboard_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("dashboard_dirty", False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("dashboard_dirty", None)
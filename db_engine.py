@@ -0,0 +1,90 @@
+"""Engine settings for running SQLite under several gunicorn workers.
+
+With the default rollback journal a writer locks out every reader, and a
+second writer fails straight away with "database is locked". For SQLite
+URIs every new connection gets:
+
+    journal_mode=WAL        readers keep reading while one writer commits
+    busy_timeout            writers queue for the lock instead of failing
+    synchronous=NORMAL      fsync at checkpoints, not every commit (safe in WAL)
+    mmap_size, cache_size   fewer read() calls for the hot pages
+    temp_store=MEMORY       sorts/temp b-trees off disk
+
+Transactions still begin lazily at the first write (pysqlite's default), so
+requests only hold the write lock between their first INSERT/UPDATE and the
+commit -- keep slow work (file I/O, mail) outside that window.
+
+Config:
+    SQLITE_BUSY_TIMEOUT   ms to wait for the write lock (default 5000)
+    SQLITE_SYNCHRONOUS    default NORMAL
+    SQLITE_MMAP_SIZE      bytes (default 256 MB)
+    SQLITE_CACHE_SIZE_KB  page cache per connection (default 20000)
+"""
+import logging
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "SQLITE_BUSY_TIMEOUT": 5000,
+    "SQLITE_SYNCHRONOUS": "NORMAL",
+    "SQLITE_MMAP_SIZE": 256 * 1024 * 1024,
+    "SQLITE_CACHE_SIZE_KB": 20000,
+}
+
+_pragmas = None
+
+
+def pragmas(config):
+    """The per-connection PRAGMA statements for a config mapping."""
+    cfg = {k: config.get(k, v) for k, v in DEFAULTS.items()}
+    return [
+        f"PRAGMA busy_timeout={int(cfg['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA synchronous={cfg['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(cfg['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size=-{int(cfg['SQLITE_CACHE_SIZE_KB'])}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def _enable_wal(cur):
+    # WAL is stored in the database file, so this only switches once. The
+    # switch needs the file to itself -- if workers booting at the same time
+    # hold it, one of the others will get there.
+    mode = cur.execute("PRAGMA journal_mode").fetchone()[0].lower()
+    if mode in ("wal", "memory"):
+        return
+    try:
+        mode = cur.execute("PRAGMA journal_mode=WAL").fetchone()[0].lower()
+    except sqlite3.OperationalError:
+        return
+    if mode != "wal":
+        log.warning("SQLite refused WAL (journal_mode=%s); writers will block readers", mode)
+
+
+def apply(dbapi_conn, statements):
+    cur = dbapi_conn.cursor()
+    try:
+        for stmt in statements:
+            cur.execute(stmt)
+        _enable_wal(cur)
+    finally:
+        cur.close()
+
+
+def init_app(app):
+    global _pragmas
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        _pragmas = pragmas(app.config)
+
+
+@event.listens_for(Engine, "connect")
+def _on_connect(dbapi_conn, connection_record):
+    if _pragmas and isinstance(dbapi_conn, sqlite3.Connection):
+        apply(dbapi_conn, _pragmas)
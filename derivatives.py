@@ -0,0 +1,144 @@
+"""Attachment previews, rendered by the job worker in a process pool.
+
+After a project is saved, ``schedule(key)`` queues a ``derivatives.preview``
+job (jobs.py) for a small WebP preview of its attachment: a thumbnail for
+images, the first page for PDFs. ``flask worker`` picks the job up and
+renders in a separate process (never in the request, so the queue survives
+restarts and deploys); the result lands next to the store under
+``<UPLOAD_FOLDER>/derived/``, keyed by content hash, so duplicate uploads
+share one preview. A file that fails to render is logged and otherwise
+ignored -- the project just shows no preview.
+
+Needs Pillow (images) and pypdfium2 (PDFs); without them previews are simply
+never produced.
+
+Config:
+    PREVIEW_WORKERS  job worker's process pool size (default 1, 0 disables previews)
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, url_for
+
+import attachments
+import jobs
+
+
+log = logging.getLogger(__name__)
+
+MAX_SIZE = (480, 480)
+QUALITY = 80
+IMAGE_EXTS = {"png", "jpg", "jpeg"}
+PDF_EXTS = {"pdf"}
+
+_pool = None
+
+
+def _kind(key):
+    ext = key.rsplit(".", 1)[-1].lower() if "." in key else ""
+    if ext in IMAGE_EXTS:
+        return "image"
+    if ext in PDF_EXTS:
+        return "pdf"
+    return None
+
+
+def _render(kind, src, dest):
+    # runs in a worker process; keep it free of app/db state
+    from PIL import Image
+
+    if kind == "pdf":
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(src)
+        try:
+            img = pdf[0].render(scale=1).to_pil()
+        finally:
+            pdf.close()
+    else:
+        img = Image.open(src)
+        img.draft("RGB", MAX_SIZE)  # lets JPEG decode at reduced size
+
+    img = img.convert("RGB")
+    img.thumbnail(MAX_SIZE)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = dest + ".tmp"
+    img.save(tmp, "WEBP", quality=QUALITY, method=4)
+    os.replace(tmp, dest)
+    return dest
+
+
+def pool():
+    """The job worker's process pool, or None if disabled."""
+    global _pool
+    if _pool is None:
+        workers = current_app.config.get("PREVIEW_WORKERS", 1)
+        if not workers:
+            return None
+        # spawn, not fork: forking a threaded process can deadlock
+        _pool = ProcessPoolExecutor(max_workers=workers,
+                                    mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def in_pool(fn, *args):
+    """Run ``fn(*args)`` in the pool and wait for it (job handlers only)."""
+    global _pool
+    try:
+        return pool().submit(fn, *args).result()
+    except BrokenProcessPool:
+        _pool = None  # a child died (likely on this very file); next try gets a fresh pool
+        raise
+
+
+def schedule(key):
+    """Queue a preview job for ``key`` if it needs one (the caller commits)."""
+    if not attachments.is_content_key(key) or not current_app.config.get("PREVIEW_WORKERS", 1):
+        return
+    if _kind(key) is None or os.path.exists(attachments.preview_path(key)):
+        return
+    jobs.enqueue("derivatives.preview", {"key": key}, key=f"preview:{key}", max_attempts=3)
+
+
+@jobs.handler("derivatives.preview")
+def _preview_job(payload):
+    key = payload["key"]
+    kind = _kind(key)
+    dest = attachments.preview_path(key)
+    if kind is None or os.path.exists(dest) or pool() is None:
+        return
+    try:
+        in_pool(_render, kind, os.path.abspath(attachments.path_for(key)), os.path.abspath(dest))
+    except BrokenProcessPool:
+        raise  # retried by the job runner
+    except Exception as exc:
+        log.warning("preview for %s failed: %s", key, exc)
+
+
+def preview_url(key):
+    """URL of the preview for ``key``, or None if there isn't one (yet)."""
+    if not key or not attachments.is_content_key(key) or _kind(key) is None:
+        return None
+    if not os.path.exists(attachments.preview_path(key)):
+        return None
+    return url_for("attachment_preview", digest=key.split(".", 1)[0])
+
+
+def build_missing(keys):
+    """Render missing previews for ``keys`` in this process (CLI backfill)."""
+    made = failed = 0
+    for key in keys:
+        kind = _kind(key) if attachments.is_content_key(key) else None
+        dest = attachments.preview_path(key) if kind else None
+        if kind is None or os.path.exists(dest):
+            continue
+        try:
+            _render(kind, attachments.path_for(key), dest)
+            made += 1
+        except Exception as exc:
+            failed += 1
+            log.warning("preview for %s failed: %s", key, exc)
+    return made, failed
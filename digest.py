@@ -0,0 +1,90 @@
+"""Deal digests for investors who ticked ``email_updates``.
+
+One run covers every subscriber (verified investors with email_updates) in
+a fixed number of queries: new projects are loaded once, subscribers once,
+and matching.py's vectorised ``score()`` decides which new projects suit
+which investor (IRR floor, ticket range, asset classes). Digests are
+rendered from one compiled template and sent through the outbox in
+batches.
+
+Each user's ``digest_through`` is the highest project id their digests
+have covered; it advances per batch right after that batch is sent, so a
+crashed run resumes without re-sending. New subscribers start at the
+current newest project rather than getting the whole back catalogue.
+"""
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select, update
+
+import jobs
+import matching
+import outbox
+from models import db, Project, User
+
+
+BATCH = 500  # subscribers scored, rendered and sent together
+MAX_DEALS = 10
+
+
+def _subscribed():
+    return (User.role == "investor", User.is_verified.is_(True), User.email_updates.is_(True))
+
+
+def run():
+    """Send every due digest. Returns ``(digests_sent, subscribers_seen)``."""
+    newest = db.session.scalar(select(func.max(Project.id))) or 0
+    db.session.execute(
+        update(User).where(*_subscribed(), User.digest_through.is_(None)).values(digest_through=newest)
+    )
+    db.session.commit()
+
+    oldest = db.session.scalar(select(func.min(User.digest_through)).where(*_subscribed()))
+    if oldest is None or oldest >= newest:
+        return 0, 0
+
+    window = (Project.id > oldest, Project.id <= newest)
+    vocab = matching._vocab()
+    proj = matching._load_projects(vocab, where=window)
+    cards = {r.id: r for r in db.session.execute(
+        select(Project.id, Project.title, Project.location, Project.project_type,
+               Project.irr, Project.funding).where(*window))}
+    inv = matching._load_investors(vocab, where=_subscribed() + (User.digest_through < newest,))
+    people = {r.id: r for r in db.session.execute(
+        select(User.id, User.email, User.first_name, User.digest_through)
+        .where(*_subscribed(), User.digest_through < newest))}
+
+    template = current_app.jinja_env.get_template("email/deal_digest.txt")
+    site = current_app.config.get("SITE_URL", "").rstrip("/")
+    sent = 0
+    for start in range(0, len(inv), BATCH):
+        block = inv.subset(slice(start, start + BATCH))
+        scores = matching.score(block, proj)
+        # only projects newer than each investor's own watermark
+        through = np.array([people[int(i)].digest_through for i in block.ids], dtype=np.int64)
+        scores[proj.ids[None, :] <= through[:, None]] = -np.inf
+
+        messages = []
+        for r, user_id in enumerate(block.ids.tolist()):
+            row = scores[r]
+            hits = np.flatnonzero(np.isfinite(row))
+            if not len(hits):
+                continue
+            best = hits[np.argsort(-row[hits], kind="stable")][:MAX_DEALS]
+            person = people[user_id]
+            deals = [cards[int(proj.ids[j])] for j in best]
+            body = template.render(person=person, deals=deals, more=len(hits) - len(deals), site=site)
+            messages.append((person.email, f"{len(hits)} new deal(s) for you",
+                             body, f"<digest-{user_id}-{newest}@re-marketplace>"))
+
+        outbox.send_many(messages)
+        sent += len(messages)
+        db.session.execute(
+            update(User).where(User.id.in_(block.ids.tolist())).values(digest_through=newest)
+        )
+        db.session.commit()
+    return sent, len(inv)
+
+
+@jobs.handler("digest.send")
+def _digest_job(payload):
+    run()
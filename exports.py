@@ -0,0 +1,94 @@
+"""Streaming admin exports (CSV or JSONL, optionally gzipped).
+
+Rows are fetched as plain column tuples in batches (``yield_per``, which uses
+a server-side cursor on Postgres) and encoded straight into the response, so
+memory stays flat no matter how many rows a table has.
+"""
+import csv
+import io
+import json
+import zlib
+
+from flask import Response, stream_with_context
+
+import metrics
+from models import db
+
+
+BATCH_ROWS = 1000
+CHUNK_BYTES = 64 * 1024
+
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def _rows(stmt, transforms):
+    result = db.session.execute(stmt.execution_options(yield_per=BATCH_ROWS))
+    for partition in result.partitions():
+        for row in partition:
+            if transforms:
+                row = [transforms[i](v) if i in transforms else v for i, v in enumerate(row)]
+            yield row
+
+
+def _encode_csv(header, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= CHUNK_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def _encode_jsonl(header, rows):
+    out = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(header, row)), default=str, ensure_ascii=False) + "\n"
+        out.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(out).encode("utf-8")
+            out, size = [], 0
+    yield "".join(out).encode("utf-8")
+
+
+def _gzip(chunks):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = z.compress(chunk)
+        if data:
+            yield data
+    yield z.flush()
+
+
+def export_response(name, header, stmt, fmt="csv", compress=False, transforms=None):
+    """Stream ``stmt`` (a column ``select()``) as an attachment download.
+
+    ``header`` names the selected columns in order; ``transforms`` maps a
+    column index to a function applied to each value (e.g. code -> label).
+    """
+    if fmt not in FORMATS:
+        fmt = "csv"
+    encode = _encode_csv if fmt == "csv" else _encode_jsonl
+    body = encode(header, _rows(stmt, transforms or {}))
+
+    filename = f"{name}.{fmt}"
+    mimetype = FORMATS[fmt]
+    if compress:
+        body = _gzip(body)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    body = metrics.count_export(name, fmt, body)
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -0,0 +1,225 @@
+"""Plain text from attachments, for keyword search.
+
+When a project's attachment is uploaded or replaced, ``schedule(key)``
+queues an ``extraction.text`` job; ``flask worker`` reads the file in the
+process pool it shares with previews (derivatives.py) and writes the text
+into ``AttachmentText`` keyed by content hash, so a file is only ever
+processed once however many projects use it, and search_index.py indexes it
+alongside the project fields.
+
+Readers stream their input and stop at ``MAX_CHARS``: PDFs page by page
+(pypdfium2), DOCX/XLSX by iterparsing the XML inside the zip (stdlib only),
+so a huge spreadsheet never has to fit in memory.
+"""
+import logging
+import os
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from xml.etree.ElementTree import iterparse
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+import attachments
+import derivatives
+import jobs
+from models import db, AttachmentText, Project
+
+
+log = logging.getLogger(__name__)
+
+MAX_CHARS = 500_000
+MAX_SHARED_STRINGS = 200_000
+EXTS = {"pdf", "docx", "xlsx", "txt"}
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+class _Text:
+    # collects pieces until the size cap, then signals the reader to stop
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def add(self, piece):
+        if piece:
+            piece = piece[:MAX_CHARS - self.size]
+            self.parts.append(piece)
+            self.size += len(piece)
+        return self.size < MAX_CHARS
+
+    def value(self):
+        return " ".join(self.parts)
+
+
+def _pdf(path, out):
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        for i in range(len(pdf)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            keep_going = out.add(textpage.get_text_range())
+            textpage.close()
+            page.close()
+            if not keep_going:
+                break
+    finally:
+        pdf.close()
+
+
+def _parsed(fh, drop):
+    # iterparse end events; ``drop`` elements are cleared and detached from their
+    # parent once seen, so nothing piles up under the root on a long document
+    open_els = []
+    for event, el in iterparse(fh, events=("start", "end")):
+        if event == "start":
+            open_els.append(el)
+            continue
+        open_els.pop()
+        yield el
+        if el.tag in drop:
+            el.clear()
+            if open_els:
+                open_els[-1].remove(el)
+
+
+def _sheet_number(name):
+    # xl/worksheets/sheet10.xml -> 10, so sheet10 sorts after sheet2
+    digits = name[len("xl/worksheets/sheet"):-len(".xml")]
+    return int(digits) if digits.isdigit() else float("inf")
+
+
+def _docx(path, out):
+    with zipfile.ZipFile(path) as zf, zf.open("word/document.xml") as fh:
+        for el in _parsed(fh, {_W + "p", _W + "tr"}):
+            if el.tag == _W + "t":
+                if not out.add(el.text):
+                    break
+            elif el.tag == _W + "p":
+                out.add("\n")
+
+
+def _xlsx(path, out):
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+        shared = []
+        if "xl/sharedStrings.xml" in names:
+            with zf.open("xl/sharedStrings.xml") as fh:
+                for el in _parsed(fh, {_S + "si"}):
+                    if el.tag == _S + "si":
+                        shared.append("".join(t.text or "" for t in el.iter(_S + "t")))
+                        if len(shared) >= MAX_SHARED_STRINGS:
+                            break
+
+        sheets = sorted((n for n in names if n.startswith("xl/worksheets/sheet") and n.endswith(".xml")),
+                        key=lambda n: (_sheet_number(n), n))
+        for sheet in sheets:
+            with zf.open(sheet) as fh:
+                for el in _parsed(fh, {_S + "row"}):
+                    if el.tag == _S + "c":
+                        kind = el.get("t")
+                        if kind == "inlineStr":
+                            value = "".join(t.text or "" for t in el.iter(_S + "t"))
+                        else:
+                            v = el.find(_S + "v")
+                            value = v.text if v is not None else None
+                            if kind == "s" and value is not None:
+                                idx = int(value)
+                                value = shared[idx] if idx < len(shared) else None
+                        if not out.add(value):
+                            return
+                    elif el.tag == _S + "row":
+                        out.add("\n")
+
+
+def _txt(path, out):
+    with open(path, "r", encoding="utf-8", errors="ignore") as fh:
+        while True:
+            chunk = fh.read(64 * 1024)
+            if not chunk or not out.add(chunk):
+                break
+
+
+READERS = {"pdf": _pdf, "docx": _docx, "xlsx": _xlsx, "txt": _txt}
+
+
+def _ext(key):
+    return key.rsplit(".", 1)[-1].lower() if "." in key else ""
+
+
+def extract(ext, path):
+    """Text of the file at ``path`` (runs in a worker process)."""
+    out = _Text()
+    READERS[ext](path, out)
+    return out.value().strip()
+
+
+def _save(key, status, body=None):
+    row = db.session.scalar(select(AttachmentText).where(AttachmentText.key == key))
+    if row is None:
+        row = AttachmentText(key=key)
+        db.session.add(row)
+    row.status = status
+    row.body = body
+    row.extracted_at = db.func.now()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # another worker got there first
+
+
+def needs_text(key):
+    if not attachments.is_content_key(key) or _ext(key) not in EXTS:
+        return False
+    return db.session.scalar(
+        select(AttachmentText.id).where(AttachmentText.key == key)
+    ) is None
+
+
+def schedule(key):
+    """Queue an extraction job for ``key`` unless its content was already done (the caller commits)."""
+    if not current_app.config.get("PREVIEW_WORKERS", 1) or not needs_text(key):
+        return
+    jobs.enqueue("extraction.text", {"key": key}, key=f"text:{key}", max_attempts=3)
+
+
+@jobs.handler("extraction.text")
+def _text_job(payload):
+    key = payload["key"]
+    if not needs_text(key) or derivatives.pool() is None:
+        return
+    try:
+        body = derivatives.in_pool(extract, _ext(key), os.path.abspath(attachments.path_for(key)))
+    except BrokenProcessPool:
+        raise  # retried by the job runner
+    except Exception as exc:
+        log.warning("text extraction for %s failed: %s", key, exc)
+        _save(key, "failed")
+    else:
+        _save(key, "ok" if body else "empty", body or None)
+
+
+def extract_missing(retry_failed=False):
+    """Extract text for every attachment that lacks it, in this process."""
+    if retry_failed:
+        db.session.execute(db.delete(AttachmentText).where(AttachmentText.status == "failed"))
+        db.session.commit()
+    keys = db.session.scalars(select(Project.attachment_path).distinct()
+                              .where(Project.attachment_path.isnot(None))).all()
+    done = failed = 0
+    for key in keys:
+        if not needs_text(key):
+            continue
+        try:
+            body = extract(_ext(key), attachments.path_for(key))
+            _save(key, "ok" if body else "empty", body or None)
+            done += 1
+        except Exception as exc:
+            log.warning("text extraction for %s failed: %s", key, exc)
+            _save(key, "failed")
+            failed += 1
+    return done, failed
@@ -0,0 +1,45 @@
+"""Search-form facets: distinct values plus counts, cached per role scope."""
+from sqlalchemy import func, literal, select, union_all
+
+from cache import TTLCache
+from models import db, Project
+
+
+FACETS = ("location", "location_type", "project_type", "secured")
+
+_cache = TTLCache("facets", ttl=600)
+
+
+def _compute(owner_id=None):
+    # One statement, one round trip: a GROUP BY per facet glued with UNION ALL
+    parts = []
+    for name in FACETS:
+        col = getattr(Project, name)
+        q = (
+            select(literal(name).label("facet"), col.label("value"), func.count().label("n"))
+            .where(col.isnot(None))
+            .group_by(col)
+        )
+        if owner_id is not None:
+            q = q.where(Project.user_id == owner_id)
+        parts.append(q)
+
+    counts = {name: [] for name in FACETS}
+    for facet, value, n in db.session.execute(union_all(*parts)):
+        counts[facet].append((value, n))
+    for values in counts.values():
+        values.sort()
+    return counts
+
+
+def for_scope(owner_id=None):
+    """``{facet: [(value, count), ...]}`` sorted by value.
+
+    ``owner_id`` restricts the counts to one developer's projects (the same
+    scoping ``search()`` applies); ``None`` means the whole catalogue.
+    """
+    return _cache.get_or_set(owner_id, lambda: _compute(owner_id))
+
+
+def invalidate():
+    _cache.clear()
@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, BooleanField, SubmitField, SelectField
-from wtforms.validators import Optional, Length, DataRequired
+from wtforms.validators import Optional, Length, DataRequired, NumberRange
 from models import AUM_CHOICES
 
 
@@ -27,11 +27,11 @@ class ProfileForm(FlaskForm):
     # New preferences as StringFields (as requested)
     preferred_asset_classes = StringField("Preferred Project Types", validators=[Optional(), Length(max=300)])
     location_type_preference = StringField("Location type preference", validators=[Optional(), Length(max=200)])
-    target_min_irr = StringField("Target minimum IRR (%)", validators=[Optional(), Length(max=20)])
+    target_min_irr = FloatField("Target minimum IRR (%)", validators=[Optional(), NumberRange(min=0, max=100)])
 
-    # Ticket min/max (also strings; change to FloatField if you want numeric validation)
-    ticket_min = StringField("Ticket min", validators=[Optional(), Length(max=50)])
-    ticket_max = StringField("Ticket max", validators=[Optional(), Length(max=50)])
+    # Ticket min/max in USD millions (typed columns on User)
+    ticket_min = FloatField("Ticket min", validators=[Optional(), NumberRange(min=0)])
+    ticket_max = FloatField("Ticket max", validators=[Optional(), NumberRange(min=0)])
 
     # Email updates toggle
     email_updates = BooleanField("Email me updates and deal digests")
@@ -0,0 +1,171 @@
+"""Production gunicorn settings (``gunicorn app:app -c gunicorn.conf.py``).
+
+The app is imported once in the master (``preload_app``) and warmed there --
+every Jinja template compiled, the URL map built -- then ``gc.freeze()``
+moves all of that into the permanent generation so forked workers share
+the pages instead of copying them the first time the collector walks them.
+Each worker then drops inherited DB connections and opens its own pool
+before it takes traffic, so the first requests after a deploy don't pay
+for imports, template compilation or connects.
+
+Worker count follows the CPUs we may actually use (cgroup quota included),
+capped by memory. Everything can be overridden from the environment:
+
+    PORT                  listen port (default 8000)
+    WEB_CONCURRENCY       number of worker processes
+    GUNICORN_THREADS      threads per worker (default 4)
+    WORKER_MEMORY_MB      budget per worker when autosizing (default 150)
+    GUNICORN_TIMEOUT      worker timeout in seconds (default 30)
+    MAX_REQUESTS          recycle a worker after this many requests (default 1000)
+    METRICS_PORT          also serve the metrics text from the master on this
+                          port (METRICS_ADDR, default 127.0.0.1)
+    PROMETHEUS_MULTIPROC_DIR  where workers keep their metric files (see metrics.py)
+"""
+import gc
+import os
+import random
+import shutil
+import tempfile
+
+
+def _read(path):
+    try:
+        with open(path) as fh:
+            return fh.read().strip()
+    except OSError:
+        return None
+
+
+def _cpus():
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = _read("/sys/fs/cgroup/cpu.max")  # cgroup v2: "<quota> <period>" or "max <period>"
+    if quota and not quota.startswith("max"):
+        q, period = quota.split()
+        cpus = min(cpus, int(q) / int(period))
+    else:  # cgroup v1
+        q, period = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        if q and period and int(q) > 0:
+            cpus = min(cpus, int(q) / int(period))
+    return max(cpus, 1)
+
+
+def _memory_mb():
+    total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        limit = _read(path)
+        if limit and limit.isdigit():
+            total = min(total, int(limit))
+    return total // (1024 * 1024)
+
+
+def _workers():
+    by_cpu = int(_cpus() * 2) + 1
+    by_memory = int(_memory_mb() * 0.8) // int(os.environ.get("WORKER_MEMORY_MB", 150))
+    return max(1, min(by_cpu, by_memory))
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY") or _workers())
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then, staggered so they don't all restart at once
+max_requests = int(os.environ.get("MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# per-worker metric files; must exist before prometheus_client is imported.
+# The default is per master (this file is loaded in the master, and again
+# in the same process on SIGHUP) so two instances on a host stay apart.
+_default_metrics_dir = os.path.join(tempfile.gettempdir(), f"re-marketplace-metrics-{os.getpid()}")
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", _default_metrics_dir)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+# no collections while the app is imported; back on after the freeze. This
+# has to happen at load time -- with preload_app the import comes before
+# on_starting -- but a SIGHUP re-reads this file without another when_ready,
+# so on_reload and post_fork switch it back on as well.
+gc.disable()
+
+
+def on_starting(server):
+    """Master, once per start (not on reload): drop counters from a previous run."""
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def on_exit(server):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR") == _default_metrics_dir:
+        shutil.rmtree(_default_metrics_dir, ignore_errors=True)
+
+
+def when_ready(server):
+    """Master, after the app is loaded and before the first fork."""
+    app = server.app.wsgi()
+    compiled = failed = 0
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+            compiled += 1
+        except Exception as exc:
+            failed += 1
+            server.log.debug("warmup: template %s: %s", name, exc)
+    app.url_map.update()
+    gc.collect()
+    gc.freeze()
+    gc.enable()
+    if os.environ.get("METRICS_PORT"):
+        import metrics
+        from prometheus_client import start_http_server
+
+        start_http_server(int(os.environ["METRICS_PORT"]), addr=os.environ.get("METRICS_ADDR", "127.0.0.1"),
+                          registry=metrics.registry())
+    server.log.info("warmup: %d templates compiled (%d skipped), %d workers x %d threads",
+                    compiled, failed, workers, threads)
+
+
+def on_reload(server):
+    gc.enable()
+
+
+def post_fork(server, worker):
+    from models import db
+
+    gc.enable()
+
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)  # never share the master's sockets
+    random.seed()
+
+
+def post_worker_init(worker):
+    """Open this worker's DB connections before it accepts requests."""
+    from sqlalchemy import text
+
+    from models import db
+
+    app = worker.app.wsgi()
+    with app.app_context():
+        conns = []
+        try:
+            for _ in range(min(threads, db.engine.pool.size() if hasattr(db.engine.pool, "size") else 1)):
+                conn = db.engine.connect()
+                conn.execute(text("SELECT 1"))
+                conns.append(conn)
+        except Exception as exc:
+            worker.log.warning("warmup: database not reachable yet: %s", exc)
+        finally:
+            for conn in conns:
+                conn.close()  # back into the pool, still open
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)  # drop its live gauges
@@ -0,0 +1,159 @@
+"""Durable background jobs in a plain DB table.
+
+Request handlers call ``enqueue()`` before their own commit, so the job is
+stored in the same transaction as the row that caused it -- either both
+land or neither does -- and the request returns without doing slow I/O.
+``flask worker`` runs ``work()``, which claims due jobs in batches and runs
+the handler registered for each ``kind``.
+
+Claiming is one ``UPDATE ... WHERE id IN (SELECT ... LIMIT n) RETURNING``:
+on Postgres the inner select uses ``FOR UPDATE SKIP LOCKED`` so several
+workers never wait on each other; on SQLite the statement is its own short
+write transaction. A job whose worker died is reclaimed once its lease runs
+out, unless that was its last attempt, in which case it is marked failed.
+Failures are retried with exponential backoff up to ``max_attempts``.
+
+Handlers must tolerate running more than once (at-least-once delivery);
+``idempotency_key`` stops the same job being queued twice.
+"""
+import logging
+import os
+import random
+import socket
+import time
+from datetime import timedelta
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, Job, utcnow
+
+
+log = logging.getLogger(__name__)
+
+BATCH = 10
+LEASE_SECONDS = 600
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+
+_handlers = {}
+
+
+def handler(kind):
+    """Register ``fn(payload)`` as the handler for jobs of ``kind``."""
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, payload=None, key=None, delay=0, max_attempts=5):
+    """Queue a job in the current transaction (the caller commits).
+
+    A second job with the same ``key`` is silently dropped.
+    """
+    values = dict(kind=kind, payload=payload or {}, idempotency_key=key, status="queued",
+                  attempts=0, max_attempts=max_attempts,
+                  run_at=utcnow() + timedelta(seconds=delay))
+    dialect = db.session.get_bind().dialect.name
+    if key and dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        db.session.execute(insert(Job).values(**values)
+                           .on_conflict_do_nothing(index_elements=["idempotency_key"]))
+    elif key and db.session.scalar(select(Job.id).where(Job.idempotency_key == key)):
+        return
+    else:
+        db.session.add(Job(**values))
+
+
+def _worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(batch=BATCH, worker=None):
+    """Mark up to ``batch`` due jobs as running for this worker; returns their ids."""
+    now = utcnow()
+    expired = and_(Job.status == "running", Job.locked_at < now - timedelta(seconds=LEASE_SECONDS))
+    # a job that keeps killing its worker never gets to run()'s attempt check
+    db.session.execute(
+        update(Job)
+        .where(expired, Job.attempts >= Job.max_attempts)
+        .values(status="failed", finished_at=now, locked_at=None, locked_by=None,
+                last_error="lease expired: worker died on the last attempt")
+    )
+    due = (
+        select(Job.id)
+        .where(or_(
+            and_(Job.status == "queued", Job.run_at <= now),
+            and_(expired, Job.attempts < Job.max_attempts),
+        ))
+        .order_by(Job.run_at)
+        .limit(batch)
+    )
+    if db.session.get_bind().dialect.name == "postgresql":
+        due = due.with_for_update(skip_locked=True)
+    ids = db.session.scalars(
+        update(Job)
+        .where(Job.id.in_(due.scalar_subquery()))
+        .values(status="running", locked_at=now, locked_by=worker or _worker_id(),
+                attempts=Job.attempts + 1)
+        .returning(Job.id)
+    ).all()
+    db.session.commit()
+    return ids
+
+
+def _backoff(attempts):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def run(job_id):
+    """Run one claimed job and record the outcome. Returns the final status."""
+    job = db.session.get(Job, job_id)
+    fn = _handlers.get(job.kind)
+    try:
+        if fn is None:
+            raise LookupError(f"no handler for job kind {job.kind!r}")
+        fn(job.payload)
+    except Exception as exc:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.last_error = f"{type(exc).__name__}: {exc}"
+        if job.attempts >= job.max_attempts:
+            job.status = "failed"
+            job.finished_at = utcnow()
+            log.error("job %s (%s) failed for good: %s", job.id, job.kind, exc)
+        else:
+            job.status = "queued"
+            job.run_at = utcnow() + timedelta(seconds=_backoff(job.attempts))
+            log.warning("job %s (%s) failed, retrying: %s", job.id, job.kind, exc)
+    else:
+        job.status = "done"
+        job.finished_at = utcnow()
+        job.last_error = None
+    job.locked_at = job.locked_by = None
+    db.session.commit()
+    return job.status
+
+
+def work(once=False, batch=BATCH, poll=2.0):
+    """Worker loop: claim, run, sleep when idle. ``once`` drains what is due and returns."""
+    worker = _worker_id()
+    done = 0
+    while True:
+        ids = claim(batch, worker)
+        for job_id in ids:
+            run(job_id)
+            done += 1
+        if not ids:
+            if once:
+                return done
+            time.sleep(poll)
+
+
+def stats():
+    """Job counts by status, for the admin dashboard."""
+    rows = db.session.execute(select(Job.status, db.func.count()).group_by(Job.status)).all()
+    return dict(rows)
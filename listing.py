@@ -0,0 +1,83 @@
+"""Keyset-paginated, column-projected project listings for the search page."""
+from sqlalchemy import func
+
+from models import Project
+
+
+SYNOPSIS_CHARS = 200
+
+# Only what a result card renders. The description is cut down in SQL so the
+# full Text blobs (description/timeline/exit_strategy) never leave the DB.
+CARD_COLUMNS = (
+    Project.id,
+    Project.title,
+    Project.project_type,
+    Project.risk_level,
+    Project.budget,
+    Project.funding,
+    Project.irr,
+    Project.duration,
+    Project.location,
+    Project.attachment_path,
+    Project.attachment_name,
+    Project.user_id,
+    func.substr(Project.description, 1, SYNOPSIS_CHARS).label("synopsis"),
+)
+
+
+def encode_cursor(row=None, snapshot=None, offset=0):
+    """Next-page cursor: the last row's id, or ``snapshot:offset`` for ranked pages."""
+    if snapshot is not None:
+        return f"{snapshot}:{offset}"
+    return str(row.id)
+
+
+def decode_cursor(value, ranked=False):
+    """Parse a cursor into ``(snapshot, offset)`` when ranked, else ``(None, id)``.
+
+    Junk input just restarts paging.
+    """
+    if not value:
+        return None
+    try:
+        if ranked:
+            snapshot, _, offset = value.partition(":")
+            snapshot, offset = int(snapshot), int(offset)
+            return (snapshot, offset) if snapshot >= 0 and offset >= 0 else None
+        return None, int(value)
+    except ValueError:
+        return None
+
+
+def page(query, after=None, size=20, rank=None, extra=()):
+    """Fetch one page of result cards from ``query``.
+
+    Pages walk ``Project.id`` downwards, so rows inserted meanwhile never
+    shift later pages. Ranked keyword searches can't keyset on the score --
+    bm25/ts_rank depend on the whole corpus, so one insert changes every
+    row's rank -- so their cursor freezes the matching set at the highest
+    id seen on page 1 and pages by offset within it, best first. Returns
+    ``(rows, next_cursor)``; ``next_cursor`` is ``None`` on the last page.
+    """
+    ranked = rank is not None
+    cols = CARD_COLUMNS + tuple(extra)
+    if ranked:
+        cols += (rank.label("rank"),)
+    query = query.with_entities(*cols)
+
+    key = decode_cursor(after, ranked)
+    if ranked:
+        snapshot, offset = key or (query.session.query(func.max(Project.id)).scalar() or 0, 0)
+        query = query.filter(Project.id <= snapshot).order_by(rank.desc(), Project.id.desc()).offset(offset)
+    else:
+        if key:
+            query = query.filter(Project.id < key[1])
+        query = query.order_by(Project.id.desc())
+    # one extra row tells us whether there is a next page without a COUNT(*)
+    rows = query.limit(size + 1).all()
+
+    next_cursor = None
+    if len(rows) > size:
+        next_cursor = (encode_cursor(snapshot=snapshot, offset=offset + size) if ranked
+                       else encode_cursor(rows[size - 1]))
+    return rows[:size], next_cursor
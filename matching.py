@@ -0,0 +1,283 @@
+"""Investor <-> project matching driven by profile preferences.
+
+Scores are computed with NumPy over whole arrays of investors and projects
+(never per-pair Python loops) and the best ``TOP_N`` per investor are kept in
+the ``project_match`` table. Reading recommendations is then a single indexed
+lookup; writes are incremental:
+
+* ``refresh_project(id)`` re-scores one project against every investor and
+  merges it into their lists (investors that lose it are re-ranked in full).
+* ``remove_project(id)`` drops a project about to be deleted.
+* ``refresh_investor(id)`` re-scores one investor against every project.
+* ``rebuild_all()`` recomputes everything (CLI: ``flask match-rebuild``).
+
+Preference units follow the profile form: ``target_min_irr`` in percent,
+``ticket_min``/``ticket_max`` in USD millions like ``Project.funding``.
+"""
+import re
+
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert, select
+
+from models import db, Project, ProjectMatch, User
+
+
+TOP_N = 10
+CHUNK = 512  # investors scored per block, keeps the score matrix small
+
+# weights for the soft part of the score (hard filters give -inf)
+W_IRR_EXCESS = 0.1   # per IRR point above the investor's minimum, capped
+IRR_EXCESS_CAP = 20.0
+W_LOCATION = 0.5     # location_type matches the stated preference
+W_RISK = 0.05        # per risk-level point (1-10)
+
+
+def _to_float(value):
+    try:
+        return float(str(value).replace("%", "").replace(",", "").strip())
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _tokens(value):
+    return {t.strip() for t in re.split(r"[,;/|]+", str(value or "").lower()) if t.strip()}
+
+
+class _Projects:
+    def __init__(self, rows, vocab):
+        rows = list(rows)
+        self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.irr = np.array([_to_float(r[1]) for r in rows], dtype=np.float64)
+        self.funding = np.array([_to_float(r[2]) for r in rows], dtype=np.float64)
+        self.risk = np.array([_to_float(r[3]) for r in rows], dtype=np.float64)
+        self.type_code = np.array([vocab.code((r[4] or "").lower()) for r in rows], dtype=np.int64)
+        self.loc_code = np.array([vocab.code((r[5] or "").lower()) for r in rows], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class _Investors:
+    def __init__(self, rows, vocab):
+        rows = list(rows)
+        prefs = [r[4] if isinstance(r[4], dict) else {} for r in rows]
+        self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+        # typed columns: NULL -> NaN means "no constraint"
+        self.min_irr = np.array([r[1] for r in rows], dtype=np.float64)
+        self.ticket_min = np.array([r[2] for r in rows], dtype=np.float64)
+        self.ticket_max = np.array([r[3] for r in rows], dtype=np.float64)
+        self.loc_code = np.array(
+            [vocab.code(str(p.get("location_type_preference") or "").strip().lower()) for p in prefs],
+            dtype=np.int64,
+        )
+        # allowed[i, type_code]; investors without a preference accept every type
+        classes = [_tokens(p.get("preferred_asset_classes")) for p in prefs]
+        codes = [[c for c in map(vocab.code, cs) if c >= 0] for cs in classes]
+        self.allowed = np.zeros((len(rows), vocab.size), dtype=bool)
+        for i, cs in enumerate(codes):
+            if cs:
+                self.allowed[i, cs] = True
+            else:
+                self.allowed[i, :] = True
+
+    def __len__(self):
+        return len(self.ids)
+
+    def subset(self, mask):
+        sub = object.__new__(_Investors)
+        for name in ("ids", "min_irr", "ticket_min", "ticket_max", "loc_code", "allowed"):
+            setattr(sub, name, getattr(self, name)[mask])
+        return sub
+
+
+class _Vocab:
+    # Shared string -> int codes so investor and project categories compare as ints
+    def __init__(self, size):
+        self.size = size
+        self._codes = {}
+
+    def code(self, value):
+        if not value:
+            return -1
+        if value not in self._codes:
+            if len(self._codes) >= self.size:
+                return -1
+            self._codes[value] = len(self._codes)
+        return self._codes[value]
+
+
+def _vocab():
+    return _Vocab(size=256)
+
+
+def _load_projects(vocab, project_ids=None, exclude=None, where=()):
+    q = select(Project.id, Project.irr, Project.funding, Project.risk_level,
+               Project.project_type, Project.location_type).where(*where)
+    if project_ids is not None:
+        q = q.where(Project.id.in_(project_ids))
+    if exclude is not None:
+        q = q.where(Project.id != exclude)
+    return _Projects(db.session.execute(q), vocab)
+
+
+def _load_investors(vocab, user_ids=None, where=()):
+    q = select(User.id, User.target_min_irr, User.ticket_min, User.ticket_max,
+               User.preferences_json).where(User.role == "investor", *where)
+    if user_ids is not None:
+        q = q.where(User.id.in_(user_ids))
+    return _Investors(db.session.execute(q), vocab)
+
+
+def score(inv, proj):
+    """``len(inv) x len(proj)`` score matrix; ``-inf`` marks a hard mismatch."""
+    irr = proj.irr[None, :]
+    funding = proj.funding[None, :]
+    min_irr = inv.min_irr[:, None]
+    tmin = inv.ticket_min[:, None]
+    tmax = inv.ticket_max[:, None]
+
+    with np.errstate(invalid="ignore"):
+        ok = np.isnan(min_irr) | (irr >= min_irr)
+        ok &= np.isnan(tmin) | (funding >= tmin)
+        ok &= np.isnan(tmax) | (funding <= tmax)
+    type_ok = np.where(proj.type_code >= 0, proj.type_code, 0)
+    ok &= inv.allowed[:, type_ok] | (proj.type_code < 0)[None, :]
+
+    excess = np.clip(np.nan_to_num(irr - np.nan_to_num(min_irr, nan=0.0), nan=0.0), 0.0, IRR_EXCESS_CAP)
+    loc_match = (inv.loc_code[:, None] >= 0) & (inv.loc_code[:, None] == proj.loc_code[None, :])
+    risk = np.nan_to_num(proj.risk[None, :], nan=5.0)
+
+    s = 1.0 + W_IRR_EXCESS * excess + W_LOCATION * loc_match - W_RISK * risk
+    return np.where(ok, s, -np.inf)
+
+
+def _top_rows(inv, proj):
+    """Yield ``ProjectMatch`` row dicts for each investor's best ``TOP_N``."""
+    if not len(proj):
+        return
+    n = min(TOP_N, len(proj))
+    for start in range(0, len(inv), CHUNK):
+        block = inv.subset(slice(start, start + CHUNK))
+        s = score(block, proj)
+        top = np.argpartition(-s, n - 1, axis=1)[:, :n]
+        top_scores = np.take_along_axis(s, top, axis=1)
+        rows, cols = np.nonzero(np.isfinite(top_scores))
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            yield {
+                "user_id": int(block.ids[r]),
+                "project_id": int(proj.ids[top[r, c]]),
+                "score": float(top_scores[r, c]),
+            }
+
+
+def _insert(rows):
+    rows = list(rows)
+    if rows:
+        db.session.execute(insert(ProjectMatch), rows)
+
+
+def rebuild_all():
+    vocab = _vocab()
+    proj = _load_projects(vocab)
+    inv = _load_investors(vocab)
+    db.session.execute(delete(ProjectMatch))
+    _insert(_top_rows(inv, proj))
+    db.session.commit()
+
+
+def refresh_investor(user_id):
+    """Re-rank one investor (call after their profile/role changes)."""
+    _rerank([user_id])
+    db.session.commit()
+
+
+def _rerank(user_ids, exclude=None):
+    vocab = _vocab()
+    inv = _load_investors(vocab, user_ids)
+    db.session.execute(delete(ProjectMatch).where(ProjectMatch.user_id.in_(user_ids)))
+    if len(inv):
+        _insert(_top_rows(inv, _load_projects(vocab, exclude=exclude)))
+
+
+def remove_project(project_id):
+    """Take a project out of every list. Call *before* deleting it, in the
+    same transaction (an ON DELETE CASCADE would otherwise hide who lost it).
+    """
+    had = db.session.scalars(
+        select(ProjectMatch.user_id).where(ProjectMatch.project_id == project_id)
+    ).all()
+    db.session.execute(delete(ProjectMatch).where(ProjectMatch.project_id == project_id))
+    if had:
+        _rerank(had, exclude=project_id)
+
+
+def refresh_project(project_id):
+    """Merge one created or edited project into every investor's list."""
+    had = db.session.scalars(
+        select(ProjectMatch.user_id).where(ProjectMatch.project_id == project_id)
+    ).all()
+    db.session.execute(delete(ProjectMatch).where(ProjectMatch.project_id == project_id))
+
+    vocab = _vocab()
+    proj = _load_projects(vocab, [project_id])
+    if len(proj):
+        inv = _load_investors(vocab)
+        s = score(inv, proj)[:, 0]
+
+        # current list size / weakest score per investor, aligned with inv.ids
+        stats = db.session.execute(
+            select(ProjectMatch.user_id, func.count(), func.min(ProjectMatch.score))
+            .group_by(ProjectMatch.user_id)
+            .order_by(ProjectMatch.user_id)
+        ).all()
+        count = np.zeros(len(inv), dtype=np.int64)
+        weakest = np.full(len(inv), -np.inf)
+        if stats:
+            st_ids = np.array([r[0] for r in stats], dtype=np.int64)
+            pos = np.searchsorted(st_ids, inv.ids)
+            found = (pos < len(st_ids)) & (st_ids[np.minimum(pos, len(st_ids) - 1)] == inv.ids)
+            count[found] = [stats[p][1] for p in pos[found]]
+            weakest[found] = [stats[p][2] for p in pos[found]]
+
+        # investors who lost it are fully re-ranked below
+        keep = np.isfinite(s) & ~np.isin(inv.ids, np.array(had, dtype=np.int64))
+        gains = keep & ((count < TOP_N) | (s > weakest))
+        _insert(
+            {"user_id": int(u), "project_id": project_id, "score": float(v)}
+            for u, v in zip(inv.ids[gains], s[gains])
+        )
+
+        # lists that were already full drop their weakest entry
+        full = inv.ids[gains & (count >= TOP_N)]
+        if len(full):
+            weakest_row = (
+                select(ProjectMatch.project_id)
+                .where(ProjectMatch.user_id == bindparam("uid"))
+                .order_by(ProjectMatch.score, ProjectMatch.project_id)
+                .limit(1)
+                .scalar_subquery()
+            )
+            table = ProjectMatch.__table__
+            db.session.execute(
+                delete(table)
+                .where(table.c.user_id == bindparam("uid"))
+                .where(table.c.project_id == weakest_row),
+                [{"uid": int(u)} for u in full],
+            )
+
+    if had:
+        _rerank(had)
+    db.session.commit()
+
+
+def recommended(user_id, limit=TOP_N):
+    """Best-first recommended projects for an investor (one indexed query)."""
+    return (
+        db.session.query(Project.id, Project.title, Project.irr, Project.funding,
+                         Project.location, Project.project_type)
+        .join(ProjectMatch, ProjectMatch.project_id == Project.id)
+        .filter(ProjectMatch.user_id == user_id)
+        .order_by(ProjectMatch.score.desc())
+        .limit(limit)
+        .all()
+    )
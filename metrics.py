@@ -0,0 +1,123 @@
+"""Prometheus metrics: request latency per endpoint, status codes, in-flight
+requests, DB pool checkout wait and export volume.
+
+Under gunicorn every worker is its own process, so the counters can't just
+live in memory: with ``PROMETHEUS_MULTIPROC_DIR`` set (gunicorn.conf.py does
+this) prometheus_client keeps each worker's values in mmap'd files in that
+directory and ``/metrics`` adds them all up, whichever worker answers.
+Without it (the dev server) the values stay in process.
+
+``/metrics`` answers admins and anyone presenting ``METRICS_TOKEN`` as a
+bearer token. Alternatively set ``METRICS_PORT`` and gunicorn's master
+serves the same text on that port (bind it to a private interface).
+
+Latency is time to the response headers; streamed export bodies are counted
+in ``export_bytes_total`` instead.
+"""
+import hmac
+import os
+import time
+
+from flask import Response, abort, current_app, g, request
+from flask_login import current_user
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               REGISTRY, generate_latest, multiprocess)
+
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to response headers, per endpoint",
+    ["endpoint", "method"], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter(
+    "http_requests_total", "Responses by endpoint and status code",
+    ["endpoint", "method", "status"])
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being handled right now",
+    multiprocess_mode="livesum")
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled DB connection",
+    buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5, 30))
+EXPORT_BYTES = Counter(
+    "export_bytes_total", "Bytes streamed by admin exports",
+    ["export", "format"])
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+def registry():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        reg = CollectorRegistry()
+        multiprocess.MultiProcessCollector(reg)
+        return reg
+    return REGISTRY
+
+
+def init_app(app):
+    """Call before ``db.init_app`` so the engine picks up the timed pool."""
+    app.config.setdefault("METRICS_TOKEN", None)
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    if not (url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")):
+        app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {}).setdefault("poolclass", TimedQueuePool)
+    app.before_request(_start)
+    app.teardown_request(_done)
+    app.after_request(_count)
+    app.add_url_rule("/metrics", "metrics", _metrics_view)
+
+
+def _endpoint():
+    # unmatched URLs share one label, so scanners can't blow up the series count
+    return request.endpoint or "<unmatched>"
+
+
+def _start():
+    g.pop("_metrics_counted", None)
+    g._metrics_started = time.perf_counter()
+    IN_FLIGHT.inc()
+
+
+def _observe(status):
+    REQUEST_LATENCY.labels(_endpoint(), request.method).observe(time.perf_counter() - g._metrics_started)
+    REQUESTS.labels(_endpoint(), request.method, status).inc()
+    g._metrics_counted = True
+
+
+def _count(response):
+    if "_metrics_started" in g:
+        _observe(str(response.status_code))
+    return response
+
+
+def _done(exc):
+    if "_metrics_started" not in g:
+        return
+    if "_metrics_counted" not in g:  # an unhandled exception skipped after_request
+        _observe("500")
+    IN_FLIGHT.dec()
+
+
+def count_export(name, fmt, chunks):
+    for chunk in chunks:
+        EXPORT_BYTES.labels(name, fmt).inc(len(chunk))
+        yield chunk
+
+
+def _metrics_view():
+    token = current_app.config["METRICS_TOKEN"]
+    given = request.headers.get("Authorization", "")
+    authorized = (token and hmac.compare_digest(given, f"Bearer {token}")) or (
+        current_user.is_authenticated and getattr(current_user, "role", "") == "admin")
+    if not authorized:
+        abort(404)
+    return Response(generate_latest(registry()), mimetype=CONTENT_TYPE_LATEST)
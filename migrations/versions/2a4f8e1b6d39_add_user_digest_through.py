@@ -0,0 +1,26 @@
+"""add user.digest_through watermark for deal digests
+
+Revision ID: 2a4f8e1b6d39
+Revises: 1d9c5b3e7a62
+Create Date: 2026-10-18 20:47:31.209558
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a4f8e1b6d39'
+down_revision = '1d9c5b3e7a62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # plain ADD COLUMN; a batch rebuild of user would risk its expression index
+    op.add_column('user', sa.Column('digest_through', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('digest_through')
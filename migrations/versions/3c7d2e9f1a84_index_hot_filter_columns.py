@@ -0,0 +1,38 @@
+"""index the columns search, the dashboard and NDA lookups filter on
+
+Revision ID: 3c7d2e9f1a84
+Revises: 2a4f8e1b6d39
+Create Date: 2026-10-18 21:15:02.418337
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7d2e9f1a84'
+down_revision = '2a4f8e1b6d39'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = (
+    ('ix_project_user_id_id', 'project', ['user_id', 'id']),
+    ('ix_project_location_irr', 'project', ['location', 'irr']),
+    ('ix_project_location_type_irr', 'project', ['location_type', 'irr']),
+    ('ix_project_irr', 'project', ['irr']),
+    ('ix_nda_request_created_at', 'nda_request', ['created_at']),
+    ('ix_nda_request_user_project', 'nda_request', ['user_id', 'project_id']),
+    ('ix_nda_request_project_id', 'nda_request', ['project_id']),
+    ('ix_callback_request_timestamp', 'callback_request', ['timestamp']),
+)
+
+
+def upgrade():
+    # plain CREATE INDEX; no batch rebuilds of the tables
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,76 @@
+"""add project full-text index
+
+Revision ID: 3f9a1c2d7b41
+Revises: 528f96087944
+Create Date: 2026-10-18 09:12:44.318904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2d7b41'
+down_revision = '528f96087944'
+branch_labels = None
+depends_on = None
+
+
+PG_VECTOR = (
+    "to_tsvector('english'::regconfig, "
+    "coalesce(project.title, '') || ' ' || "
+    "coalesce(project.description, '') || ' ' || "
+    "coalesce(project.location, ''))"
+)
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    if conn.dialect.name == "sqlite":
+        # External-content FTS5 table, kept in sync by triggers on project
+        op.execute("""
+            CREATE VIRTUAL TABLE project_fts USING fts5(
+                title, description, location,
+                content='project', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER project_fts_ai AFTER INSERT ON project BEGIN
+                INSERT INTO project_fts(rowid, title, description, location)
+                VALUES (new.id, new.title, new.description, new.location);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER project_fts_ad AFTER DELETE ON project BEGIN
+                INSERT INTO project_fts(project_fts, rowid, title, description, location)
+                VALUES ('delete', old.id, old.title, old.description, old.location);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER project_fts_au AFTER UPDATE OF title, description, location ON project BEGIN
+                INSERT INTO project_fts(project_fts, rowid, title, description, location)
+                VALUES ('delete', old.id, old.title, old.description, old.location);
+                INSERT INTO project_fts(rowid, title, description, location)
+                VALUES (new.id, new.title, new.description, new.location);
+            END
+        """)
+        # backfill existing rows
+        op.execute("INSERT INTO project_fts(project_fts) VALUES ('rebuild')")
+
+    elif conn.dialect.name == "postgresql":
+        op.execute(f"CREATE INDEX ix_project_search ON project USING gin ({PG_VECTOR})")
+
+
+def downgrade():
+    conn = op.get_bind()
+
+    if conn.dialect.name == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS project_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS project_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS project_fts_ai")
+        op.execute("DROP TABLE IF EXISTS project_fts")
+
+    elif conn.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_project_search")
@@ -0,0 +1,36 @@
+"""add project_match table
+
+Revision ID: a7c4e19b2d53
+Revises: 3f9a1c2d7b41
+Create Date: 2026-10-18 11:40:02.551837
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e19b2d53'
+down_revision = '3f9a1c2d7b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('project_match',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['project.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'project_id')
+    )
+    op.create_index('ix_project_match_user_score', 'project_match', ['user_id', 'score'], unique=False)
+    op.create_index('ix_project_match_project_id', 'project_match', ['project_id'], unique=False)
+    # populate with: flask match-rebuild
+
+
+def downgrade():
+    op.drop_index('ix_project_match_project_id', table_name='project_match')
+    op.drop_index('ix_project_match_user_score', table_name='project_match')
+    op.drop_table('project_match')
@@ -0,0 +1,89 @@
+"""promote hot preference keys to typed columns
+
+Revision ID: c2e8f05a9d17
+Revises: a7c4e19b2d53
+Create Date: 2026-10-18 14:02:31.907415
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e8f05a9d17'
+down_revision = 'a7c4e19b2d53'
+branch_labels = None
+depends_on = None
+
+
+NUMERIC_KEYS = ('target_min_irr', 'ticket_min', 'ticket_max')
+
+user = sa.table(
+    'user',
+    sa.column('id', sa.Integer),
+    sa.column('preferences_json', sa.JSON),
+    sa.column('target_min_irr', sa.Float),
+    sa.column('ticket_min', sa.Float),
+    sa.column('ticket_max', sa.Float),
+    sa.column('email_updates', sa.Boolean),
+)
+
+
+def _to_float(value):
+    if value in (None, ""):
+        return None
+    try:
+        return float(str(value).replace("%", "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def _prefs(raw):
+    if isinstance(raw, dict):
+        return dict(raw)
+    try:
+        return json.loads(raw) if raw else {}
+    except Exception:
+        return {}
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('target_min_irr', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('ticket_min', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('ticket_max', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('email_updates', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+    # Move the values out of the JSON blob (one pass, runs once)
+    conn = op.get_bind()
+    for uid, raw in conn.execute(sa.select(user.c.id, user.c.preferences_json)).all():
+        prefs = _prefs(raw)
+        values = {k: _to_float(prefs.pop(k, None)) for k in NUMERIC_KEYS}
+        values['email_updates'] = bool(prefs.pop('email_updates', False))
+        values['preferences_json'] = prefs
+        conn.execute(user.update().where(user.c.id == uid).values(**values))
+
+    op.create_index('ix_user_role_email_updates_min_irr', 'user',
+                    ['role', 'email_updates', 'target_min_irr'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_role_email_updates_min_irr', table_name='user')
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(user.c.id, user.c.preferences_json, user.c.target_min_irr,
+                                  user.c.ticket_min, user.c.ticket_max, user.c.email_updates)).all()
+    for uid, raw, min_irr, tmin, tmax, email_updates in rows:
+        prefs = _prefs(raw)
+        for key, value in zip(NUMERIC_KEYS, (min_irr, tmin, tmax)):
+            prefs[key] = "" if value is None else f"{value:g}"
+        prefs['email_updates'] = bool(email_updates)
+        conn.execute(user.update().where(user.c.id == uid).values(preferences_json=prefs))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('email_updates')
+        batch_op.drop_column('ticket_max')
+        batch_op.drop_column('ticket_min')
+        batch_op.drop_column('target_min_irr')
@@ -0,0 +1,35 @@
+"""widen user.password_hash
+
+Revision ID: d41b7a0c6e92
+Revises: c2e8f05a9d17
+Create Date: 2026-10-18 16:25:09.114203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b7a0c6e92'
+down_revision = 'c2e8f05a9d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # scrypt hashes from werkzeug are ~160 chars; 150 fails on Postgres.
+    # SQLite doesn't enforce VARCHAR length, and a batch table rebuild there
+    # would risk the expression index on lower(email), so skip it.
+    if op.get_bind().dialect.name == "sqlite":
+        return
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash', existing_type=sa.String(length=150),
+                              type_=sa.String(length=255), existing_nullable=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "sqlite":
+        return
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash', existing_type=sa.String(length=255),
+                              type_=sa.String(length=150), existing_nullable=False)
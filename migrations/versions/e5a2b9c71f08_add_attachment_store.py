@@ -0,0 +1,36 @@
+"""add attachment store
+
+Revision ID: e5a2b9c71f08
+Revises: d41b7a0c6e92
+Create Date: 2026-10-18 17:02:41.530817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a2b9c71f08'
+down_revision = 'd41b7a0c6e92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attachment_blob',
+        sa.Column('key', sa.String(length=80), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('key')
+    )
+    # plain ADD COLUMN works on SQLite too, no batch rebuild needed
+    op.add_column('project', sa.Column('attachment_name', sa.String(length=255), nullable=True))
+    # existing rows still use the flat layout, where the stored name is the original one
+    op.execute("UPDATE project SET attachment_name = attachment_path WHERE attachment_path IS NOT NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.drop_column('attachment_name')
+    op.drop_table('attachment_blob')
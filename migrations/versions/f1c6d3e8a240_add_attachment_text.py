@@ -0,0 +1,76 @@
+"""add attachment text and its search index
+
+Revision ID: f1c6d3e8a240
+Revises: e5a2b9c71f08
+Create Date: 2026-10-18 18:11:07.402695
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6d3e8a240'
+down_revision = 'e5a2b9c71f08'
+branch_labels = None
+depends_on = None
+
+
+PG_ATTACHMENT_VECTOR = "to_tsvector('english'::regconfig, coalesce(attachment_text.body, ''))"
+
+
+def upgrade():
+    op.create_table('attachment_text',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=80), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('body', sa.Text(), nullable=True),
+        sa.Column('extracted_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('key')
+    )
+    # search joins attachment text back to projects on this
+    op.create_index('ix_project_attachment_path', 'project', ['attachment_path'], unique=False)
+
+    conn = op.get_bind()
+    if conn.dialect.name == "sqlite":
+        op.execute("""
+            CREATE VIRTUAL TABLE attachment_fts USING fts5(
+                body,
+                content='attachment_text', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER attachment_fts_ai AFTER INSERT ON attachment_text BEGIN
+                INSERT INTO attachment_fts(rowid, body) VALUES (new.id, new.body);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER attachment_fts_ad AFTER DELETE ON attachment_text BEGIN
+                INSERT INTO attachment_fts(attachment_fts, rowid, body) VALUES ('delete', old.id, old.body);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER attachment_fts_au AFTER UPDATE OF body ON attachment_text BEGIN
+                INSERT INTO attachment_fts(attachment_fts, rowid, body) VALUES ('delete', old.id, old.body);
+                INSERT INTO attachment_fts(rowid, body) VALUES (new.id, new.body);
+            END
+        """)
+
+    elif conn.dialect.name == "postgresql":
+        op.execute(f"CREATE INDEX ix_attachment_text_search ON attachment_text USING gin ({PG_ATTACHMENT_VECTOR})")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS attachment_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS attachment_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS attachment_fts_ai")
+        op.execute("DROP TABLE IF EXISTS attachment_fts")
+    elif conn.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_attachment_text_search")
+
+    op.drop_index('ix_project_attachment_path', table_name='project')
+    op.drop_table('attachment_text')
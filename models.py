@@ -1,12 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import JSON
 from sqlalchemy.dialects.sqlite import JSON as SQLITE_JSON  # optional fallback
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import validates
+from sqlalchemy.orm.attributes import set_committed_value
 from flask_login import UserMixin  # For user session support
 from werkzeug.security import generate_password_hash, check_password_hash
 import os, json
+from datetime import datetime, timezone
 from flask import url_for
 
 db = SQLAlchemy()
@@ -23,7 +26,7 @@ class CallbackRequest(db.Model):
     email = db.Column(db.String(120))
     phone = db.Column(db.String(50), nullable=False)
     message = db.Column(db.Text)
-    timestamp = db.Column(db.DateTime, default=db.func.now())
+    timestamp = db.Column(db.DateTime, default=db.func.now(), index=True)  # dashboard sorts on it
 
 class NDARequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -33,7 +36,27 @@ class NDARequest(db.Model):
     contact_name = db.Column(db.String(100), nullable=False)
     contact_email = db.Column(db.String(255), nullable=False)
     message = db.Column(db.Text, nullable=True)
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), index=True)
+
+    __table_args__ = (
+        db.Index("ix_nda_request_user_project", "user_id", "project_id"),
+        db.Index("ix_nda_request_project_id", "project_id"),
+    )
+
+
+def utcnow():
+    # naive UTC, matching how the DateTime columns are stored
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _to_float_or_none(value):
+    # "12", "12%", "1,000" -> float; blanks and junk -> None
+    if value in (None, ""):
+        return None
+    try:
+        return float(str(value).replace("%", "").replace(",", "").strip())
+    except ValueError:
+        return None
 
 
 AUM_CHOICES = [
@@ -45,7 +68,7 @@ AUM_CHOICES = [
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(150), nullable=False, unique=True)
-    password_hash = db.Column(db.String(150), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), default='developer')
     track_record = db.Column(db.String(200), nullable=True)   # e.g. "10 years / 12 deals"
     geo_focus    = db.Column(db.String(150), nullable=True)   # e.g. "UK, DACH, Nordics"
@@ -61,12 +84,26 @@ class User(UserMixin, db.Model):
     aum = db.Column(db.String(20))  # values: 'lt50', '50-100', 'gt100'
     # aum = db.Column(db.Float)
     is_verified = db.Column(db.Boolean, nullable=False, default=False)
+    digest_through = db.Column(db.Integer)  # highest Project.id already covered by a deal digest
 
     projects = db.relationship('Project', backref='owner', lazy=True)
 
     # Store all profile preferences here to avoid schema churn
     preferences_json = db.Column(db.JSON, nullable=False, default=dict)
 
+    # Hot preference keys live in typed columns so they can be filtered and
+    # indexed in SQL; exposed through the hybrid properties below.
+    _target_min_irr = db.Column("target_min_irr", db.Float, nullable=True)
+    _ticket_min = db.Column("ticket_min", db.Float, nullable=True)
+    _ticket_max = db.Column("ticket_max", db.Float, nullable=True)
+    _email_updates = db.Column("email_updates", db.Boolean, nullable=False, default=False,
+                               server_default=db.false())
+
+    __table_args__ = (
+        # e.g. "investors with email_updates and min IRR <= 12"
+        db.Index("ix_user_role_email_updates_min_irr", "role", "email_updates", "target_min_irr"),
+    )
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -79,10 +116,16 @@ class User(UserMixin, db.Model):
             return {}
         if isinstance(prefs, dict):
             return prefs
+        # raw JSON text: parse once per instance, not on every property access
+        cached = self.__dict__.get("_prefs_parsed")
+        if cached is not None and cached[0] is prefs:
+            return cached[1]
         try:
-            return json.loads(prefs) if prefs else {}
+            parsed = json.loads(prefs)
         except Exception:
-            return {}
+            parsed = {}
+        self.__dict__["_prefs_parsed"] = (prefs, parsed)
+        return parsed
 
     def set_preferences(self, prefs: dict) -> None:
         if not isinstance(prefs, dict):
@@ -100,9 +143,35 @@ class User(UserMixin, db.Model):
         return self.get_preferences().get(key, default)
 
     def _pref_set(self, key, value):
-        prefs = self.get_preferences()
-        prefs[key] = value
-        self.set_preferences(prefs)
+        self.patch_preferences({key: value})
+
+    def patch_preferences(self, changes: dict) -> None:
+        """Merge ``changes`` into preferences_json.
+
+        For saved users this is a partial update in SQL (``json_set`` on
+        SQLite, ``jsonb ||`` on Postgres) instead of rewriting the document;
+        the in-memory copy is updated to match without marking it dirty.
+        """
+        merged = dict(self.get_preferences())
+        merged.update(changes)
+        if self.id is None or self in db.session.new:
+            self.set_preferences(merged)
+            return
+
+        dialect = db.session.get_bind().dialect.name
+        col = User.__table__.c.preferences_json
+        if dialect == "postgresql":
+            expr = db.cast(db.cast(col, JSONB).op("||")(db.cast(changes, JSONB)), db.JSON)
+        else:
+            args = []
+            for key, value in changes.items():
+                args += [f'$."{key}"', db.func.json(json.dumps(value))]
+            expr = db.func.json_set(col, *args)
+
+        db.session.execute(
+            User.__table__.update().where(User.__table__.c.id == self.id).values(preferences_json=expr)
+        )
+        set_committed_value(self, "preferences_json", merged)
 
     @hybrid_property
     def preferred_asset_classes(self):
@@ -122,35 +191,35 @@ class User(UserMixin, db.Model):
 
     @hybrid_property
     def target_min_irr(self):
-        return self._pref_get("target_min_irr", "")
+        return self._target_min_irr
 
     @target_min_irr.setter
     def target_min_irr(self, v):
-        self._pref_set("target_min_irr", v)
+        self._target_min_irr = _to_float_or_none(v)
 
     @hybrid_property
     def email_updates(self):
-        return bool(self._pref_get("email_updates", False))
+        return self._email_updates
 
     @email_updates.setter
     def email_updates(self, v):
-        self._pref_set("email_updates", bool(v))
+        self._email_updates = bool(v)
 
     @hybrid_property
     def ticket_min(self):
-        return self._pref_get("ticket_min", "")
+        return self._ticket_min
 
     @ticket_min.setter
     def ticket_min(self, v):
-        self._pref_set("ticket_min", v)
+        self._ticket_min = _to_float_or_none(v)
 
     @hybrid_property
     def ticket_max(self):
-        return self._pref_get("ticket_max", "")
+        return self._ticket_max
 
     @ticket_max.setter
     def ticket_max(self, v):
-        self._pref_set("ticket_max", v)
+        self._ticket_max = _to_float_or_none(v)
 
     def __repr__(self):
         return f'<User {self.email}>'
@@ -168,8 +237,9 @@ class Project(db.Model):
     location = db.Column(db.String(100), nullable=False)
     risk_level = db.Column(db.Integer, default=5)  # 1-10 scale
     secured = db.Column(db.String(50), default='mezz')
-    attachment_path = db.Column(db.String(300))
-    
+    attachment_path = db.Column(db.String(300), index=True)  # content key, see attachments.py
+    attachment_name = db.Column(db.String(255))  # original file name, for downloads
+
     timeline = db.Column(db.String(200), nullable=True)
     exit_strategy = db.Column(db.String(200), nullable=True)
     developer_tr = db.Column(db.String(200), nullable=True)  
@@ -183,11 +253,91 @@ class Project(db.Model):
     
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # New: Links to user
 
+    # search() filters; the trailing columns let facets and filtered listings
+    # read the index alone (see query_plans.py)
+    __table_args__ = (
+        db.Index("ix_project_user_id_id", "user_id", "id"),
+        db.Index("ix_project_location_irr", "location", "irr"),
+        db.Index("ix_project_location_type_irr", "location_type", "irr"),
+        db.Index("ix_project_irr", "irr"),
+    )
+
     def __repr__(self):
         return f'<Project {self.title}>'
 
     @property
     def attachment_url(self):
-        if self.attachment_path:
-            return url_for('uploaded_file', filename=self.attachment_path)
-        return None
\ No newline at end of file
+        if not self.attachment_path:
+            return None
+        if self.attachment_name:
+            return url_for('uploaded_file', filename=self.attachment_path, name=self.attachment_name)
+        return url_for('uploaded_file', filename=self.attachment_path)
+
+    @property
+    def preview_url(self):
+        # small WebP of the attachment, once the background render has finished
+        import derivatives
+        return derivatives.preview_url(self.attachment_path)
+
+
+class AttachmentBlob(db.Model):
+    # One row per stored file in the content-addressed store (attachments.py)
+    key = db.Column(db.String(80), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+
+class AttachmentText(db.Model):
+    # Plain text pulled out of a stored attachment (extraction.py), indexed for search
+    id = db.Column(db.Integer, primary_key=True)  # FTS5 rowid on SQLite
+    key = db.Column(db.String(80), unique=True, nullable=False)
+    status = db.Column(db.String(16), nullable=False)  # ok / empty / failed
+    body = db.deferred(db.Column(db.Text))
+    extracted_at = db.Column(db.DateTime, server_default=db.func.now())
+
+
+class UploadSession(db.Model):
+    # An in-progress resumable upload (resumable.py); the bytes live in uploads/sessions/<id>
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    sha256 = db.Column(db.String(64))  # optional whole-file checksum from the client
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, index=True)
+
+
+class Job(db.Model):
+    # Background work queued in the same transaction as the change that caused it (jobs.py)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    idempotency_key = db.Column(db.String(120), unique=True)
+    status = db.Column(db.String(16), nullable=False, default="queued")  # queued/running/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    locked_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(64))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_job_status_run_at", "status", "run_at"),
+    )
+
+
+class ProjectMatch(db.Model):
+    # Precomputed top-N recommended projects per investor (see matching.py)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey("project.id", ondelete="CASCADE"), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_project_match_user_score", "user_id", "score"),
+        db.Index("ix_project_match_project_id", "project_id"),
+    )
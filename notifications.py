@@ -0,0 +1,40 @@
+"""Team notifications for new NDA and callback requests, sent as jobs."""
+from flask import current_app, render_template
+from sqlalchemy import select
+
+import jobs
+import outbox
+from models import db, User, Project, NDARequest, CallbackRequest
+
+
+def _recipients():
+    configured = current_app.config.get("NOTIFY_EMAILS")
+    if configured:
+        return [e.strip() for e in configured.split(",") if e.strip()]
+    return list(db.session.scalars(select(User.email).where(User.role == "admin")))
+
+
+def _send_to_team(subject, template, message_id, **context):
+    to = _recipients()
+    if not to:
+        return  # nobody to tell; not worth retrying
+    outbox.send(to, subject, render_template(template, **context), message_id=message_id)
+
+
+@jobs.handler("notify.nda_request")
+def nda_request(payload):
+    req = db.session.get(NDARequest, payload["id"])
+    if req is None:
+        return
+    project = db.session.get(Project, req.project_id) if req.project_id else None
+    _send_to_team(f"NDA request from {req.company}", "email/nda_request.txt",
+                  f"<nda-request-{req.id}@re-marketplace>", req=req, project=project)
+
+
+@jobs.handler("notify.callback_request")
+def callback_request(payload):
+    req = db.session.get(CallbackRequest, payload["id"])
+    if req is None:
+        return
+    _send_to_team(f"Callback request from {req.name or req.email}", "email/callback_request.txt",
+                  f"<callback-request-{req.id}@re-marketplace>", req=req)
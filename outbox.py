@@ -0,0 +1,64 @@
+"""Outgoing email, sent from background jobs only.
+
+With ``MAIL_SERVER`` set, messages go over SMTP -- in development point it at
+a local stand-in such as ``python -m aiosmtpd -n -l localhost:8025`` or
+MailHog. Without it they are written as ``.eml`` files to ``OUTBOX_DIR``
+(default ``instance/outbox``), which is handy for checking what would have
+been sent.
+
+Config:
+    MAIL_SERVER, MAIL_PORT (default 25), MAIL_USERNAME, MAIL_PASSWORD,
+    MAIL_USE_TLS, MAIL_FROM, OUTBOX_DIR
+"""
+import os
+import smtplib
+from email.message import EmailMessage
+from email.utils import make_msgid
+
+from flask import current_app
+
+
+def _message(to, subject, body, message_id=None):
+    cfg = current_app.config
+    msg = EmailMessage()
+    msg["From"] = cfg.get("MAIL_FROM", "no-reply@localhost")
+    msg["To"] = ", ".join(to) if isinstance(to, (list, tuple)) else to
+    msg["Subject"] = subject
+    # a stable id lets the receiving side spot a retried job's duplicate
+    msg["Message-ID"] = message_id or make_msgid()
+    msg.set_content(body)
+    return msg
+
+
+def _outbox_dir():
+    return current_app.config.get("OUTBOX_DIR") or os.path.join(current_app.instance_path, "outbox")
+
+
+def send(to, subject, body, message_id=None):
+    send_many([(to, subject, body, message_id)])
+
+
+def send_many(messages):
+    """Send ``(to, subject, body, message_id)`` tuples over one SMTP connection."""
+    cfg = current_app.config
+    msgs = [_message(*m) for m in messages]
+    if not msgs:
+        return  # no point opening (and logging in to) an SMTP session
+    if cfg.get("MAIL_SERVER"):
+        with smtplib.SMTP(cfg["MAIL_SERVER"], int(cfg.get("MAIL_PORT", 25)), timeout=30) as smtp:
+            if cfg.get("MAIL_USE_TLS"):
+                smtp.starttls()
+            if cfg.get("MAIL_USERNAME"):
+                smtp.login(cfg["MAIL_USERNAME"], cfg.get("MAIL_PASSWORD", ""))
+            for msg in msgs:
+                smtp.send_message(msg)
+        return
+
+    out = _outbox_dir()
+    os.makedirs(out, exist_ok=True)
+    for msg in msgs:
+        name = msg["Message-ID"].strip("<>").replace("@", "_").replace("/", "_") + ".eml"
+        path = os.path.join(out, name)
+        with open(path + ".tmp", "wb") as fh:
+            fh.write(msg.as_bytes())
+        os.replace(path + ".tmp", path)
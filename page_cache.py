@@ -0,0 +1,110 @@
+"""Whole-response cache for the mostly static marketing pages.
+
+``@page_cache.cached()`` keeps the rendered HTML per (endpoint, signed in,
+role, verified) -- the only things ``base.html`` varies on besides the
+"Hi, <email>" greeting, which is rendered as a placeholder (the ``personal``
+filter) and filled in per request. Responses get a strong ETag over the
+final body, so repeat visits revalidate to a ``304``.
+
+Entries are keyed on a fingerprint of the template files, so a deploy that
+changes a template never serves the old render, and nothing is cached while
+templates auto-reload (debug). Requests with pending flash messages bypass
+the cache, since rendering them consumes the messages.
+
+Config:
+    PAGE_CACHE_TTL      seconds an entry lives in a worker (default 300)
+    PAGE_CACHE_MAX_AGE  browser/proxy max-age for signed-out pages (default 60)
+"""
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, g, request, session
+from flask_login import current_user
+from markupsafe import escape
+
+from cache import TTLCache
+
+
+EMAIL_PLACEHOLDER = "\ue010user-email\ue011"  # private-use chars survive escaping
+
+_cache = TTLCache("pages", ttl=300, maxsize=256)
+_fingerprint = None
+
+
+def _templates_fingerprint(app):
+    digest = hashlib.blake2b(digest_size=8)
+    for dirpath, _, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        for name in sorted(files):
+            st = os.stat(os.path.join(dirpath, name))
+            digest.update(f"{dirpath}/{name}:{st.st_mtime_ns}:{st.st_size};".encode())
+    return digest.hexdigest()
+
+
+def init_app(app):
+    global _fingerprint
+    _cache.ttl = app.config.setdefault("PAGE_CACHE_TTL", 300)
+    app.config.setdefault("PAGE_CACHE_MAX_AGE", 60)
+    _fingerprint = _templates_fingerprint(app)
+    app.add_template_filter(personal)
+
+
+def personal(value):
+    """Template filter for per-user text inside a cached page."""
+    if g.get("_page_cache_render"):
+        return EMAIL_PLACEHOLDER
+    return value
+
+
+def _bypass(skip):
+    return (
+        request.method != "GET"
+        or current_app.jinja_env.auto_reload
+        or session.get("_flashes")
+        or (skip is not None and skip())
+    )
+
+
+def cached(skip=None):
+    """Cache the decorated view's response; ``skip()`` -> True renders fresh."""
+    def decorate(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if _bypass(skip):
+                return view(*args, **kwargs)
+
+            authed = current_user.is_authenticated
+            key = (request.endpoint, tuple(sorted(kwargs.items())), authed,
+                   current_user.role if authed else None,
+                   bool(current_user.is_verified) if authed else None,
+                   _fingerprint)
+            body = _cache.get(key)
+            if body is None:
+                g._page_cache_render = True
+                try:
+                    rv = current_app.make_response(view(*args, **kwargs))
+                finally:
+                    g._page_cache_render = False
+                if rv.status_code != 200:
+                    return rv
+                body = rv.get_data(as_text=True)
+                _cache.set(key, body)
+
+            if authed:
+                body = body.replace(EMAIL_PLACEHOLDER, str(escape(current_user.email)))
+            resp = current_app.response_class(body, mimetype="text/html")
+            resp.set_etag(hashlib.blake2b(body.encode(), digest_size=16).hexdigest())
+            if authed:
+                resp.cache_control.private = True
+                resp.cache_control.no_cache = True
+            else:
+                resp.cache_control.public = True
+                resp.cache_control.max_age = current_app.config["PAGE_CACHE_MAX_AGE"]
+            resp.vary.add("Cookie")
+            return resp.make_conditional(request)
+        return wrapper
+    return decorate
+
+
+def clear():
+    _cache.clear()
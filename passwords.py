@@ -0,0 +1,125 @@
+"""Password hashing with a concurrency bound and tunable cost.
+
+This is a bound, not a way to free the request thread: the thread that asks
+for a hash still waits for it. What the small pool buys is that at most
+``PASSWORD_HASH_WORKERS`` hashes run at once per process, so a burst of
+logins can't take every core, while other request threads keep serving
+(hashlib's scrypt/pbkdf2 release the GIL). Past ``PASSWORD_HASH_QUEUE``
+hashes queued or running, a caller waits up to 5 s for a slot and is then
+shed with ``HashingBusy`` rather than piling up behind the pool.
+
+When a login succeeds against a hash made with older parameters, the hash is
+transparently upgraded to ``PASSWORD_HASH_METHOD``.
+
+Config:
+    PASSWORD_HASH_METHOD   werkzeug method string, e.g. "scrypt:32768:8:1"
+                           or "pbkdf2:sha256:600000"
+    PASSWORD_HASH_WORKERS  pool size (default 2)
+    PASSWORD_HASH_QUEUE    max hashes queued or running before new ones are
+                           refused with ``HashingBusy`` (default 16)
+"""
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_METHOD = "scrypt:32768:8:1"
+
+
+class HashingBusy(Exception):
+    """Too many hashes in flight; the caller should ask the user to retry."""
+
+
+_method = DEFAULT_METHOD
+_pool = None
+_slots = None
+_timings = collections.deque(maxlen=1000)  # recent durations in ms
+
+
+def init_app(app):
+    global _method, _pool, _slots
+    # werkzeug fills in defaults ("scrypt" -> "scrypt:32768:8:1") and stores the
+    # full form, so compare against that or every login would rehash
+    _method = _method_of(generate_password_hash("x", app.config.setdefault("PASSWORD_HASH_METHOD", DEFAULT_METHOD)))
+    workers = app.config.setdefault("PASSWORD_HASH_WORKERS", 2)
+    queue = app.config.setdefault("PASSWORD_HASH_QUEUE", 16)
+    _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+    _slots = threading.BoundedSemaphore(queue)
+
+
+def _run(fn, *args):
+    # blocks the caller until its hash is done; the pool only caps concurrency
+    if _pool is None:
+        return fn(*args)
+    if not _slots.acquire(timeout=5):
+        raise HashingBusy()
+    try:
+        return _pool.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    try:
+        return _run(fn, *args)
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        _timings.append(ms)
+        log.debug("password %s took %.1f ms", fn.__name__, ms)
+
+
+def hash_password(password):
+    return _timed(generate_password_hash, password, _method)
+
+
+def _method_of(pwhash):
+    return (pwhash or "").split("$", 1)[0]
+
+
+def needs_rehash(pwhash):
+    return _method_of(pwhash) != _method
+
+
+def verify(user, password):
+    """Check ``password`` for ``user``; upgrade the stored hash if it is stale.
+
+    The upgraded hash is set on ``user`` -- the caller commits.
+    """
+    if not user.password_hash:
+        return False
+    if not _timed(check_password_hash, user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+    return True
+
+
+def stats():
+    """Latency percentiles (ms) over the most recent hashes/verifications."""
+    samples = sorted(_timings)
+    if not samples:
+        return {"count": 0}
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 1)
+
+    return {"count": len(samples), "method": _method,
+            "p50": pct(50), "p95": pct(95), "p99": pct(99), "max": round(samples[-1], 1)}
+
+
+def benchmark(method=None, rounds=5):
+    """Time ``rounds`` hashes with ``method`` (default: configured) in ms."""
+    method = method or _method
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        generate_password_hash("benchmark-password", method)
+        times.append((time.perf_counter() - start) * 1000)
+    return sorted(times)
@@ -0,0 +1,287 @@
+"""On-demand and sampled request profiling.
+
+A request carrying a valid profile token in an ``X-Profile`` header runs
+under a profiler, and the result lands in ``instance/profiles/``. Only the
+header is read -- a token in the URL would end up in access logs, proxy logs
+and Referer headers. Tokens are signed with the app's secret key and
+expire after ``PROFILE_TOKEN_MAX_AGE`` seconds; admins get one from
+Admin > Profiles or ``flask profile-token``. There are two modes:
+
+- ``sample`` (default): a background thread snapshots the request thread's
+  stack every ``PROFILE_INTERVAL_MS`` and writes collapsed stacks
+  (``frame;frame;frame count`` per line), which flamegraph.pl and
+  speedscope read directly. Cheap enough to use on production traffic.
+- ``cprofile``: deterministic ``cProfile`` stats (``.prof``, for pstats or
+  snakeviz). Much slower; every call is timed.
+
+On top of that, a ``PROFILE_SAMPLE_RATE`` fraction of requests to the
+endpoints in ``PROFILE_SAMPLE_ENDPOINTS`` (search and the exports) is
+profiled in sample mode with no token, so there's always something recent
+to look at. Profiling stops when the response is closed, so streamed
+export bodies are included. The admin view splits samples between
+templates, forms, the ORM and the rest.
+
+Config:
+    PROFILE_DIR               output directory (default instance/profiles)
+    PROFILE_INTERVAL_MS       stack sampling interval (default 5)
+    PROFILE_SAMPLE_RATE       background sampling rate (default 0.01; 0 turns it off)
+    PROFILE_SAMPLE_ENDPOINTS  fnmatch patterns (default "search", "export_*")
+    PROFILE_KEEP              newest files kept (default 200)
+    PROFILE_TOKEN_MAX_AGE     token lifetime in seconds (default 3600)
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from fnmatch import fnmatch
+from functools import lru_cache
+
+from flask import abort, current_app, g, request, send_from_directory, url_for
+from flask_admin import BaseView, expose
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+
+MODES = ("sample", "cprofile")
+
+# first matching path prefix decides where a sample's time went (innermost frame first)
+AREAS = (
+    ("jinja2/", "templates"),
+    ("wtforms/", "forms"),
+    ("flask_wtf/", "forms"),
+    ("sqlalchemy/", "ORM / SQL"),
+    ("flask_sqlalchemy/", "ORM / SQL"),
+)
+
+_NAME = re.compile(r"^(\d{8}T\d{6})-(\d+)-(sample|cprofile)-(.+)-(\d+)ms\.(collapsed|prof)$")
+
+
+def init_app(app):
+    cfg = app.config
+    cfg.setdefault("PROFILE_DIR", os.path.join(app.instance_path, "profiles"))
+    cfg.setdefault("PROFILE_INTERVAL_MS", 5)
+    cfg.setdefault("PROFILE_SAMPLE_RATE", 0.01)
+    cfg.setdefault("PROFILE_SAMPLE_ENDPOINTS", ("search", "export_*"))
+    cfg.setdefault("PROFILE_KEEP", 200)
+    cfg.setdefault("PROFILE_TOKEN_MAX_AGE", 3600)
+    app.before_request(_start)
+    app.after_request(_hand_off)
+    app.teardown_request(_teardown)
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt="request-profile")
+
+
+def token(mode="sample"):
+    """A signed token that profiles any request sending it."""
+    return _serializer().dumps({"mode": mode})
+
+
+def _requested_mode():
+    given = request.headers.get("X-Profile")
+    if not given:
+        return None
+    try:
+        data = _serializer().loads(given, max_age=current_app.config["PROFILE_TOKEN_MAX_AGE"])
+    except BadSignature:  # includes expired tokens
+        return None
+    return data.get("mode") if data.get("mode") in MODES else None
+
+
+def _sampled():
+    cfg = current_app.config
+    rate = cfg["PROFILE_SAMPLE_RATE"]
+    return bool(rate and request.endpoint and random.random() < rate
+                and any(fnmatch(request.endpoint, p) for p in cfg["PROFILE_SAMPLE_ENDPOINTS"]))
+
+
+class Sampler(threading.Thread):
+    """Counts collapsed stacks of one thread, sampled every ``interval`` seconds."""
+
+    def __init__(self, thread_id, interval, root):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        self.stacks = Counter()
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            labels = []
+            while frame is not None:
+                labels.append(_label(frame.f_code, self.root))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+
+@lru_cache(maxsize=4096)
+def _label(code, root):
+    path = code.co_filename
+    if "site-packages" + os.sep in path:
+        path = path.rsplit("site-packages" + os.sep, 1)[1]
+    elif path.startswith(root + os.sep):
+        path = os.path.relpath(path, root)
+    else:
+        path = os.sep.join(path.split(os.sep)[-2:])
+    return f"{path}:{code.co_name}".replace(";", ",")
+
+
+class Profile:
+    """One profiled request. ``finish()`` may run after the request context is gone."""
+
+    def __init__(self, mode):
+        cfg = current_app.config
+        self.mode = mode
+        self.endpoint = request.endpoint or "unmatched"
+        self.directory = cfg["PROFILE_DIR"]
+        self.keep = cfg["PROFILE_KEEP"]
+        self.stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self.started = time.perf_counter()
+        self.profile = self.sampler = None
+        if mode == "cprofile":
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+                return
+            except ValueError:  # another profiler is already active in this process
+                self.profile, self.mode = None, "sample"
+        self.sampler = Sampler(threading.get_ident(), cfg["PROFILE_INTERVAL_MS"] / 1000.0,
+                               current_app.root_path)
+        self.sampler.start()
+
+    def finish(self):
+        ms = int((time.perf_counter() - self.started) * 1000)
+        if self.profile is not None:
+            self.profile.disable()
+        else:
+            self.sampler.stop()
+            if not self.sampler.stacks:
+                return None
+        os.makedirs(self.directory, exist_ok=True)
+        ext = "prof" if self.profile is not None else "collapsed"
+        name = f"{self.stamp}-{os.getpid()}-{self.mode}-{self.endpoint}-{ms}ms.{ext}"
+        path = os.path.join(self.directory, name)
+        if self.profile is not None:
+            self.profile.dump_stats(path)
+        else:
+            with open(path, "w", encoding="utf-8") as fh:
+                for stack, n in self.sampler.stacks.most_common():
+                    fh.write(f"{stack} {n}\n")
+        _prune(self.directory, self.keep)
+        return name
+
+
+def _start():
+    mode = _requested_mode() or ("sample" if _sampled() else None)
+    if mode:
+        g._profile = Profile(mode)
+
+
+def _hand_off(response):
+    prof = g.pop("_profile", None)
+    if prof is not None:
+        response.call_on_close(prof.finish)  # after the body, so streamed exports count too
+    return response
+
+
+def _teardown(exc):
+    prof = g.pop("_profile", None)  # still here only if after_request never ran
+    if prof is not None:
+        prof.finish()
+
+
+def _prune(directory, keep):
+    names = sorted(n for n in os.listdir(directory) if _NAME.match(n))
+    for name in names[:-keep]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def listing():
+    """Profiles on disk, newest first, as dicts parsed from the file names."""
+    directory = current_app.config["PROFILE_DIR"]
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    found = []
+    for name in names:
+        m = _NAME.match(name)
+        if m:
+            found.append({"name": name, "at": datetime.strptime(m.group(1), "%Y%m%dT%H%M%S"),
+                          "pid": int(m.group(2)), "mode": m.group(3), "endpoint": m.group(4),
+                          "ms": int(m.group(5)), "size": os.path.getsize(os.path.join(directory, name))})
+    return sorted(found, key=lambda p: p["name"], reverse=True)
+
+
+def breakdown(stacks):
+    """Share of samples per area (templates, forms, ORM / SQL, other), plus the top leaf frames."""
+    areas, leaves = Counter(), Counter()
+    total = sum(stacks.values())
+    for stack, n in stacks.items():
+        frames = stack.split(";")
+        leaves[frames[-1]] += n
+        area = next((label for frame in reversed(frames) for prefix, label in AREAS
+                     if frame.startswith(prefix)), "other")
+        areas[area] += n
+    share = [(area, n, 100.0 * n / total) for area, n in areas.most_common()] if total else []
+    return share, leaves.most_common(25)
+
+
+def _read_collapsed(path):
+    stacks = Counter()
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            stack, _, n = line.rstrip("\n").rpartition(" ")
+            if stack and n.isdigit():
+                stacks[stack] += int(n)
+    return stacks
+
+
+class ProfilesView(BaseView):
+    """Flask-Admin page listing recent profiles. Subclass to add access control."""
+
+    @expose("/")
+    def index(self):
+        return self.render("admin/profiles.html", profiles=listing(),
+                           tokens={mode: token(mode) for mode in MODES},
+                           max_age=current_app.config["PROFILE_TOKEN_MAX_AGE"])
+
+    @expose("/<filename>")
+    def detail(self, filename):
+        if not _NAME.match(filename):
+            abort(404)
+        path = os.path.join(current_app.config["PROFILE_DIR"], filename)
+        if not os.path.exists(path):
+            abort(404)
+        if filename.endswith(".prof"):
+            out = io.StringIO()
+            pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(40)
+            return self.render("admin/profile.html", filename=filename, stats=out.getvalue(),
+                               download=url_for(".download", filename=filename))
+        share, leaves = breakdown(_read_collapsed(path))
+        return self.render("admin/profile.html", filename=filename, share=share, leaves=leaves,
+                           download=url_for(".download", filename=filename))
+
+    @expose("/<filename>/download")
+    def download(self, filename):
+        if not _NAME.match(filename):
+            abort(404)
+        return send_from_directory(current_app.config["PROFILE_DIR"], filename, as_attachment=True)
@@ -0,0 +1,144 @@
+"""Query-plan regression check (``flask query-plans``).
+
+Requests every parameterless GET route -- plus the project pages and a few
+filtered searches -- as an anonymous visitor and as the first admin,
+developer and investor in the database, recording each SELECT that runs.
+Every distinct statement is then put through ``EXPLAIN QUERY PLAN``, and
+any full scan of a hot table is reported. The command exits non-zero when
+it finds one, so a schema change that drops an index (or a new query that
+never had one) fails CI instead of slowing the site down later. The same
+check runs in the test suite (tests/test_query_plans.py) against a
+database built with the migrations.
+
+SQLite only: the plans are what the index migrations are written against.
+Don't ANALYZE the database you check -- with statistics from a small dev
+database the planner rightly prefers scans, and the check turns noisy.
+Only GET requests are made, but they do run against the configured
+database -- point ``DATABASE_URL`` at a copy if in doubt.
+"""
+import re
+from collections import defaultdict
+
+from sqlalchemy import event, select
+
+from models import db, Project, User
+
+
+HOT_TABLES = {"project", "user", "nda_request", "callback_request", "project_match", "job"}
+
+# deliberate scans of filtered statements: table -> pattern of the statement
+ALLOWED = {
+    # catalogue-wide facet counts group every row anyway, and are cached (facets.py);
+    # an IRR floor alone matches most of the catalogue, so walking the ids
+    # backwards until the page is full beats sorting every match
+    "project": re.compile(r"AS facet\b(?!.*project\.user_id = )"
+                          r"|WHERE project\.irr >= \?(?: AND project\.id < \?)? ORDER BY project\.id DESC\s+LIMIT",
+                          re.S),
+}
+
+SKIP_ENDPOINTS = {"static", "logout"}
+
+EXTRA_URLS = (
+    "/search?irr=12",
+    "/search?location_type=prime&irr=10",
+    "/search?countries=UK&countries=France",
+    "/search?query=tower",
+)
+
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(.*)$")
+_WHERE = re.compile(r"\bWHERE\b(.*?)(?=\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|\bUNION\b|\)|$)", re.S)
+
+
+def _urls(app):
+    project_id = db.session.scalar(select(Project.id).limit(1))
+    urls = set(EXTRA_URLS)
+    for rule in app.url_map.iter_rules():
+        if "GET" not in rule.methods or rule.endpoint in SKIP_ENDPOINTS:
+            continue
+        if not rule.arguments:
+            urls.add(rule.rule)
+        elif rule.arguments == {"project_id"} and project_id:
+            urls.add(rule.rule.replace("<int:project_id>", str(project_id)))
+    return sorted(urls)
+
+
+def _users():
+    users = [None]
+    for role in ("admin", "developer", "investor"):
+        user_id = db.session.scalar(select(User.id).where(User.role == role).order_by(User.id).limit(1))
+        if user_id:
+            users.append(user_id)
+    return users
+
+
+def capture(app):
+    """Run the routes; returns ``{(sql, params): set of "url as role"}`` for SELECTs."""
+    seen = defaultdict(set)
+    where = [None]
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")) and not executemany:
+            seen[(statement, tuple(parameters or ()))].add(where[0])
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for user_id in _users():
+            client = app.test_client()
+            if user_id:
+                with client.session_transaction() as sess:
+                    sess["_user_id"] = str(user_id)
+                    sess["_fresh"] = True
+            for url in _urls(app):
+                where[0] = f"{url} as user {user_id}" if user_id else f"{url} anonymous"
+                with app.app_context():  # fresh g/session, not the CLI's context
+                    client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return seen
+
+
+def _filtered(statement):
+    # a WHERE beyond the keyset cursor ("project.id < ?") means only some rows are wanted
+    for clause in _WHERE.findall(statement):
+        if not re.fullmatch(r"\s*\w+\.id < \?\s*", clause):
+            return True
+    return False
+
+
+def scans(statement, params):
+    """Full scans of hot tables in ``statement``'s plan, as plan-detail strings.
+
+    Unfiltered reads of a whole table (counts, CSV exports, admin lists) are
+    fine; a scan is reported when the statement filters, or when it sorts the
+    whole table just to return the top rows.
+    """
+    plan = [row[-1] for row in
+            db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params)]
+    top_n = " LIMIT " in statement and any("TEMP B-TREE FOR ORDER BY" in d for d in plan)
+    filtered = _filtered(statement)
+    found = []
+    for detail in plan:
+        m = _SCAN.match(detail)
+        if not m or m.group(1) not in HOT_TABLES or "INDEX" in m.group(2):
+            continue
+        if not (filtered or top_n):
+            continue
+        allowed = ALLOWED.get(m.group(1))
+        if allowed and allowed.search(statement):
+            continue
+        found.append(detail)
+    return found
+
+
+def check(app):
+    """Returns ``[(statement, plan lines, where it ran), ...]`` for offending queries."""
+    if db.engine.dialect.name != "sqlite":
+        raise RuntimeError("query-plans runs against SQLite only")
+    problems = []
+    for (statement, params), where in capture(app).items():
+        found = scans(statement, params)
+        if found:
+            problems.append((statement, found, sorted(where)))
+    db.session.rollback()
+    return problems
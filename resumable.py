@@ -0,0 +1,179 @@
+"""Resumable, chunked attachment uploads.
+
+Big decks don't go through one multipart POST. The browser opens a session
+(``create``), then PUTs fixed-size chunks, each with its SHA-256 in
+``X-Chunk-SHA256``. Chunks are written at their offset in
+``<UPLOAD_FOLDER>/sessions/<id>``, so a resent chunk just overwrites itself,
+and ``received`` only ever grows over a contiguous prefix. After a dropped
+connection the client asks for ``received`` and carries on from there.
+
+Once every byte is in, the project form submits the session id and
+``claim`` moves the file into the attachment store. Sessions idle for longer
+than ``UPLOAD_SESSION_TTL`` are removed by ``expire()``.
+
+Config:
+    UPLOAD_CHUNK_SIZE   bytes per chunk (default 4 MB; must stay below
+                        MAX_CONTENT_LENGTH)
+    UPLOAD_MAX_SIZE     largest file accepted this way (default 512 MB)
+    UPLOAD_SESSION_TTL  seconds of inactivity before a session expires
+                        (default 24 h)
+"""
+import hashlib
+import hmac
+import os
+import uuid
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import select, update
+from werkzeug.utils import secure_filename
+
+import attachments
+from models import db, UploadSession, utcnow
+
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+DEFAULT_TTL = 24 * 3600
+
+
+class UploadError(Exception):
+    """Bad request against an upload session; ``status`` is the HTTP code."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _dir():
+    return os.path.join(current_app.config["UPLOAD_FOLDER"], "sessions")
+
+
+def _part_path(session_id):
+    return os.path.join(_dir(), session_id)
+
+
+def _get(session_id, user_id):
+    sess = db.session.get(UploadSession, session_id)
+    if sess is None or sess.user_id != user_id:
+        raise UploadError("unknown upload", 404)
+    return sess
+
+
+def describe(sess):
+    return {
+        "id": sess.id,
+        "filename": sess.filename,
+        "size": sess.size,
+        "chunk_size": sess.chunk_size,
+        "received": sess.received,
+        "complete": sess.received >= sess.size,
+    }
+
+
+def create(user_id, filename, size, sha256=None):
+    name = secure_filename(filename or "")
+    if not name:
+        raise UploadError("missing filename")
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("size must be a positive integer")
+    if size > current_app.config.get("UPLOAD_MAX_SIZE", DEFAULT_MAX_SIZE):
+        raise UploadError("file too large", 413)
+    if sha256 is not None and (len(sha256) != 64 or not all(c in "0123456789abcdef" for c in sha256)):
+        raise UploadError("sha256 must be 64 lowercase hex digits")
+
+    expire()  # cheap (indexed) and keeps abandoned parts from piling up
+    sess = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        filename=name,
+        size=size,
+        chunk_size=current_app.config.get("UPLOAD_CHUNK_SIZE", DEFAULT_CHUNK_SIZE),
+        received=0,
+        sha256=sha256,
+    )
+    os.makedirs(_dir(), exist_ok=True)
+    with open(_part_path(sess.id), "wb") as fh:
+        fh.truncate(size)
+    db.session.add(sess)
+    db.session.commit()
+    return sess
+
+
+def status(session_id, user_id):
+    return _get(session_id, user_id)
+
+
+def write_chunk(session_id, user_id, index, data, checksum):
+    """Store chunk ``index``; returns the session with ``received`` updated."""
+    sess = _get(session_id, user_id)
+    start = index * sess.chunk_size
+    if index < 0 or start >= sess.size:
+        raise UploadError("chunk out of range")
+    if start > sess.received:
+        raise UploadError(f"expected chunk {sess.received // sess.chunk_size} first", 409)
+    end = min(start + sess.chunk_size, sess.size)
+    if len(data) != end - start:
+        raise UploadError(f"chunk {index} must be {end - start} bytes")
+    if not checksum or not hmac.compare_digest(hashlib.sha256(data).hexdigest(), checksum.lower()):
+        raise UploadError("checksum mismatch", 422)
+
+    with open(_part_path(sess.id), "r+b") as fh:
+        fh.seek(start)
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+    # only moves forward, and only over a contiguous prefix, even if two
+    # requests for the same session race
+    db.session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == sess.id, UploadSession.received >= start,
+               UploadSession.received < end)
+        .values(received=end, updated_at=utcnow())
+    )
+    db.session.commit()
+    db.session.refresh(sess)
+    return sess
+
+
+def claim(session_id, user_id):
+    """Move a finished upload into the attachment store.
+
+    Returns ``(key, filename)``. The session row is deleted in the caller's
+    transaction; a bad file is left for ``expire()``.
+    """
+    sess = _get(session_id, user_id)
+    if sess.received < sess.size:
+        raise UploadError("upload is not complete", 409)
+    path = _part_path(sess.id)
+    if not os.path.exists(path):
+        raise UploadError("upload already used", 409)
+    if sess.sha256 and _sha256(path) != sess.sha256:
+        raise UploadError("file checksum mismatch", 422)
+    key = attachments.store_path(path, sess.filename)
+    db.session.delete(sess)
+    return key, sess.filename
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(attachments.CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def expire():
+    """Delete idle sessions and their partial files. Returns how many."""
+    ttl = current_app.config.get("UPLOAD_SESSION_TTL", DEFAULT_TTL)
+    cutoff = utcnow() - timedelta(seconds=ttl)
+    stale = db.session.scalars(select(UploadSession).where(UploadSession.updated_at < cutoff)).all()
+    for sess in stale:
+        try:
+            os.remove(_part_path(sess.id))
+        except FileNotFoundError:
+            pass
+        db.session.delete(sess)
+    db.session.commit()
+    return len(stale)
@@ -0,0 +1,231 @@
+"""Full-text keyword search over projects.
+
+SQLite uses an external-content FTS5 table (``project_fts``) kept in sync by
+triggers on ``project``; Postgres uses a GIN index over a ``tsvector``
+expression, so every write path (upload, edit, Flask-Admin, raw SQL) stays
+indexed without extra bookkeeping in the views.
+
+Text extracted from attachments (``attachment_text``, see extraction.py) is
+indexed the same way and searched alongside; a project matches if either its
+own fields or its attachment contain all the terms.
+"""
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import Float, Integer, String, text
+
+from models import db
+
+
+# Sentinels wrapped around matched terms in snippets. They are private-use
+# code points so they survive HTML escaping and can't come from user input
+# in any meaningful way.
+MARK_START = "\ue000"
+MARK_END = "\ue001"
+
+PG_CONFIG = "english"
+
+# attachment matches rank below a comparable hit in the project's own fields
+ATTACHMENT_WEIGHT = 0.5
+# ts_headline re-parses the whole document, so only look near the start
+PG_HEADLINE_CHARS = 20000
+
+# Must match the indexed expression exactly or Postgres won't use the index.
+PG_VECTOR = (
+    "to_tsvector('english'::regconfig, "
+    "coalesce(project.title, '') || ' ' || "
+    "coalesce(project.description, '') || ' ' || "
+    "coalesce(project.location, ''))"
+)
+PG_ATTACHMENT_VECTOR = "to_tsvector('english'::regconfig, coalesce(attachment_text.body, ''))"
+
+SQLITE_SETUP = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS project_fts USING fts5(
+        title, description, location,
+        content='project', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS project_fts_ai AFTER INSERT ON project BEGIN
+        INSERT INTO project_fts(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS project_fts_ad AFTER DELETE ON project BEGIN
+        INSERT INTO project_fts(project_fts, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS project_fts_au AFTER UPDATE OF title, description, location ON project BEGIN
+        INSERT INTO project_fts(project_fts, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+        INSERT INTO project_fts(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS attachment_fts USING fts5(
+        body,
+        content='attachment_text', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS attachment_fts_ai AFTER INSERT ON attachment_text BEGIN
+        INSERT INTO attachment_fts(rowid, body) VALUES (new.id, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS attachment_fts_ad AFTER DELETE ON attachment_text BEGIN
+        INSERT INTO attachment_fts(attachment_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS attachment_fts_au AFTER UPDATE OF body ON attachment_text BEGIN
+        INSERT INTO attachment_fts(attachment_fts, rowid, body) VALUES ('delete', old.id, old.body);
+        INSERT INTO attachment_fts(rowid, body) VALUES (new.id, new.body);
+    END
+    """,
+]
+
+SQLITE_TEARDOWN = [
+    "DROP TRIGGER IF EXISTS attachment_fts_au",
+    "DROP TRIGGER IF EXISTS attachment_fts_ad",
+    "DROP TRIGGER IF EXISTS attachment_fts_ai",
+    "DROP TABLE IF EXISTS attachment_fts",
+    "DROP TRIGGER IF EXISTS project_fts_au",
+    "DROP TRIGGER IF EXISTS project_fts_ad",
+    "DROP TRIGGER IF EXISTS project_fts_ai",
+    "DROP TABLE IF EXISTS project_fts",
+]
+
+PG_SETUP = [
+    f"CREATE INDEX IF NOT EXISTS ix_project_search ON project USING gin ({PG_VECTOR})",
+    f"CREATE INDEX IF NOT EXISTS ix_attachment_text_search ON attachment_text USING gin ({PG_ATTACHMENT_VECTOR})",
+]
+
+PG_TEARDOWN = [
+    "DROP INDEX IF EXISTS ix_attachment_text_search",
+    "DROP INDEX IF EXISTS ix_project_search",
+]
+
+
+def _dialect(bind):
+    return bind.dialect.name
+
+
+def create_index(bind):
+    """Create the index objects for ``bind`` (idempotent) and backfill them."""
+    if _dialect(bind) == "sqlite":
+        for stmt in SQLITE_SETUP:
+            bind.execute(text(stmt))
+        bind.execute(text("INSERT INTO project_fts(project_fts) VALUES ('rebuild')"))
+        bind.execute(text("INSERT INTO attachment_fts(attachment_fts) VALUES ('rebuild')"))
+    elif _dialect(bind) == "postgresql":
+        for stmt in PG_SETUP:
+            bind.execute(text(stmt))
+
+
+def drop_index(bind):
+    if _dialect(bind) == "sqlite":
+        stmts = SQLITE_TEARDOWN
+    elif _dialect(bind) == "postgresql":
+        stmts = PG_TEARDOWN
+    else:
+        return
+    for stmt in stmts:
+        bind.execute(text(stmt))
+
+
+def rebuild():
+    """Recreate and repopulate the index for the app's database."""
+    with db.engine.begin() as conn:
+        create_index(conn)
+
+
+def _terms(query_text):
+    # Only plain word characters reach the engine, so user input can never
+    # inject FTS5/tsquery operators.
+    return re.findall(r"\w+", (query_text or "").lower())[:16]
+
+
+def match(query_text):
+    """Subquery of ``(project_id, rank, snippet, in_attachment)`` for a keyword search.
+
+    Every term is prefix-matched and all terms must match, either in the
+    project's fields or in its attachment's text. ``rank`` is "higher is
+    better" on both engines; ``in_attachment`` is 1 when only the attachment
+    matched (the snippet then comes from it). Returns ``None`` when the query
+    has no searchable terms.
+    """
+    terms = _terms(query_text)
+    if not terms:
+        return None
+
+    bind = db.session.get_bind()
+    if _dialect(bind) == "sqlite":
+        stmt = text(f"""
+            SELECT project_id, MAX(rank) AS rank,
+                   COALESCE(MAX(own), MAX(att)) AS snippet,
+                   MAX(own) IS NULL AS in_attachment
+            FROM (
+                SELECT project_fts.rowid AS project_id,
+                       -bm25(project_fts, 10.0, 1.0, 4.0) AS rank,
+                       snippet(project_fts, -1, '{MARK_START}', '{MARK_END}', '…', 24) AS own,
+                       NULL AS att
+                FROM project_fts
+                WHERE project_fts MATCH :q
+                UNION ALL
+                SELECT project.id,
+                       -bm25(attachment_fts) * {ATTACHMENT_WEIGHT},
+                       NULL,
+                       snippet(attachment_fts, 0, '{MARK_START}', '{MARK_END}', '…', 24)
+                FROM attachment_fts
+                JOIN attachment_text ON attachment_text.id = attachment_fts.rowid
+                JOIN project ON project.attachment_path = attachment_text.key
+                WHERE attachment_fts MATCH :q
+            )
+            GROUP BY project_id
+        """).bindparams(q=" ".join(f'"{t}"*' for t in terms))
+    elif _dialect(bind) == "postgresql":
+        opts = f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=35, MinWords=15"
+        stmt = text(f"""
+            SELECT project_id, max(rank) AS rank,
+                   coalesce(max(own), max(att)) AS snippet,
+                   (max(own) IS NULL)::int AS in_attachment
+            FROM (
+                SELECT project.id AS project_id,
+                       ts_rank_cd({PG_VECTOR}, q) AS rank,
+                       ts_headline('{PG_CONFIG}', coalesce(project.description, ''), q, '{opts}') AS own,
+                       NULL::text AS att
+                FROM project, to_tsquery('{PG_CONFIG}', :q) AS q
+                WHERE {PG_VECTOR} @@ q
+                UNION ALL
+                SELECT project.id,
+                       ts_rank_cd({PG_ATTACHMENT_VECTOR}, q) * {ATTACHMENT_WEIGHT},
+                       NULL,
+                       ts_headline('{PG_CONFIG}', left(attachment_text.body, {PG_HEADLINE_CHARS}), q, '{opts}')
+                FROM attachment_text
+                JOIN project ON project.attachment_path = attachment_text.key,
+                     to_tsquery('{PG_CONFIG}', :q) AS q
+                WHERE {PG_ATTACHMENT_VECTOR} @@ q
+            ) AS matches
+            GROUP BY project_id
+        """).bindparams(q=" & ".join(f"{t}:*" for t in terms))
+    else:
+        raise RuntimeError(f"full-text search not supported on {_dialect(bind)}")
+
+    return stmt.columns(project_id=Integer, rank=Float, snippet=String,
+                        in_attachment=Integer).subquery("hits")
+
+
+def highlight(snippet):
+    """Render a snippet as HTML with matched terms wrapped in ``<mark>``."""
+    if not snippet:
+        return ""
+    html = str(escape(snippet))
+    return Markup(html.replace(MARK_START, "<mark>").replace(MARK_END, "</mark>"))
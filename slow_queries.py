@@ -0,0 +1,256 @@
+"""Slow-query log with EXPLAIN plans.
+
+Any statement slower than ``SLOW_QUERY_MS`` is recorded with its shape --
+the SQL with whitespace collapsed and literals and placeholders turned into
+``?`` (``IN`` lists become ``IN (?...)``) -- the types of its bound
+parameters, how long it took and the Flask endpoint that ran it. The first
+time a shape is slow, and again at most every
+``SLOW_QUERY_EXPLAIN_INTERVAL`` seconds, its plan is captured on the same
+connection (``EXPLAIN QUERY PLAN`` on SQLite; ``EXPLAIN`` inside a savepoint
+on Postgres, so a failed EXPLAIN can't spoil the request's transaction).
+
+Entries go into a ring buffer of the latest ``SLOW_QUERY_BUFFER`` in this
+worker and, as JSON lines, into ``slow_queries.<pid>.jsonl`` -- one file per
+process, opened on its first slow query, because a rotating log shared by
+forked workers loses lines when they rotate under each other. Each file
+rotates with one backup, and only the newest ``SLOW_QUERY_LOG_FILES`` files
+are kept as workers come and go. ``/admin-dashboard/slow-queries`` reads
+back the last ``SLOW_QUERY_SUMMARY_BYTES`` of each file and ranks shapes by
+total time; the ranking is kept for ``SUMMARY_TTL`` seconds, so refreshing
+the page doesn't re-read the logs.
+
+Config:
+    SLOW_QUERY_MS                threshold in ms (default 200; 0 turns it off)
+    SLOW_QUERY_EXPLAIN_INTERVAL  seconds between plans for one shape (default 600)
+    SLOW_QUERY_BUFFER            entries kept in memory (default 500)
+    SLOW_QUERY_LOG_DIR           directory for the files (default instance/logs)
+    SLOW_QUERY_LOG_BYTES         size before a file rotates (default 2 MB)
+    SLOW_QUERY_LOG_FILES         files kept, backups included (default 32)
+    SLOW_QUERY_SUMMARY_BYTES     tail of each file the summary reads (default 256 KB)
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from cache import TTLCache
+
+
+log = logging.getLogger(__name__)
+_file_log = logging.getLogger(__name__ + ".file")
+_file_log.propagate = False
+
+_threshold = 0.0
+_interval = 600
+_buffer = deque(maxlen=500)
+_explained = {}  # shape -> monotonic time of its last EXPLAIN
+_lock = threading.Lock()
+_log_dir = None
+_log_bytes = 2 * 1024 * 1024
+_log_files = 32
+_log_pid = None  # process that opened _file_log's handler
+_summary_bytes = 256 * 1024
+
+SUMMARY_TTL = 30
+_summaries = TTLCache("slow_queries", ttl=SUMMARY_TTL, maxsize=4)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.$])\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_IN_LIST = re.compile(r"\bIN \(\?(?:, \?)*\)", re.I)
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.I)
+
+
+def init_app(app):
+    global _threshold, _interval, _buffer, _log_dir, _log_bytes, _log_files, _summary_bytes
+    cfg = app.config
+    _threshold = cfg.setdefault("SLOW_QUERY_MS", 200) / 1000.0
+    _interval = cfg.setdefault("SLOW_QUERY_EXPLAIN_INTERVAL", 600)
+    _buffer = deque(maxlen=cfg.setdefault("SLOW_QUERY_BUFFER", 500))
+    _log_dir = cfg.setdefault("SLOW_QUERY_LOG_DIR", os.path.join(app.instance_path, "logs"))
+    _log_bytes = cfg.setdefault("SLOW_QUERY_LOG_BYTES", 2 * 1024 * 1024)
+    _log_files = cfg.setdefault("SLOW_QUERY_LOG_FILES", 32)
+    _summary_bytes = cfg.setdefault("SLOW_QUERY_SUMMARY_BYTES", 256 * 1024)
+
+
+def normalize(statement):
+    sql = " ".join(statement.split())
+    sql = _STRING.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _IN_LIST.sub("IN (?...)", sql)
+
+
+def _param_shape(parameters, executemany):
+    if executemany:
+        return {"rows": len(parameters), "each": _param_shape(parameters[0], False) if parameters else None}
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    return [type(v).__name__ for v in parameters or ()]
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _threshold and context is not None:
+        context._slow_query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if elapsed < _threshold:
+        return
+    try:
+        _record(conn, cursor, statement, parameters, executemany, elapsed)
+    except Exception:  # never let the recorder break the query it watched
+        log.exception("slow query recorder failed")
+
+
+def _record(conn, cursor, statement, parameters, executemany, elapsed):
+    shape = normalize(statement)
+    plan = None
+    now = time.monotonic()
+    with _lock:
+        due = not executemany and now - _explained.get(shape, -_interval) >= _interval
+        if due:
+            _explained[shape] = now
+    if due:
+        plan = _explain(conn.dialect.name, cursor.connection, statement, parameters)
+
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "ms": round(elapsed * 1000, 1),
+        "endpoint": (request.endpoint or "<unmatched>") if has_request_context() else "-",
+        "sql": shape,
+        "params": _param_shape(parameters, executemany),
+        "plan": plan,
+        "pid": os.getpid(),
+    }
+    _buffer.append(entry)
+    _open_log()
+    _file_log.info(json.dumps(entry, default=str))
+
+
+def _open_log():
+    """Point the file logger at this process's own file (again, after a fork)."""
+    global _log_pid
+    pid = os.getpid()
+    if _log_pid == pid:
+        return
+    with _lock:
+        if _log_pid == pid:
+            return
+        for handler in _file_log.handlers[:]:
+            _file_log.removeHandler(handler)  # the parent's; left open, it isn't ours to flush
+        os.makedirs(_log_dir, exist_ok=True)
+        _prune(_log_files - 2)  # room for this process's file and its backup
+        handler = RotatingFileHandler(os.path.join(_log_dir, f"slow_queries.{pid}.jsonl"),
+                                      maxBytes=_log_bytes, backupCount=1, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _file_log.addHandler(handler)
+        _file_log.setLevel(logging.INFO)
+        _log_pid = pid
+
+
+def _log_paths():
+    return glob.glob(os.path.join(_log_dir, "slow_queries.*.jsonl*")) if _log_dir else []
+
+
+def _prune(keep):
+    paths = sorted(_log_paths(), key=lambda p: os.stat(p).st_mtime, reverse=True)
+    for path in paths[max(keep, 0):]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _explain(dialect, dbapi_conn, statement, parameters):
+    if not _EXPLAINABLE.match(statement):
+        return None
+    cur = dbapi_conn.cursor()
+    try:
+        if dialect == "sqlite":
+            rows = cur.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            return "\n".join(row[-1] for row in rows)
+        if dialect == "postgresql":
+            cur.execute("SAVEPOINT slow_query_explain")
+            try:
+                cur.execute("EXPLAIN " + statement, parameters)
+                plan = "\n".join(row[0] for row in cur.fetchall())
+            except Exception:
+                cur.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                raise
+            cur.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        return None
+    except Exception as exc:
+        log.debug("EXPLAIN failed for slow query: %s", exc)
+        return None
+    finally:
+        cur.close()
+
+
+def recent():
+    """This worker's latest slow statements, newest first."""
+    return list(reversed(_buffer))
+
+
+def _tail_lines(path):
+    # the newest _summary_bytes of the file; a line cut by the seek is skipped
+    with open(path, "rb") as fh:
+        size = fh.seek(0, os.SEEK_END)
+        fh.seek(max(0, size - _summary_bytes))
+        if fh.tell():
+            fh.readline()
+        for line in fh:
+            yield line.decode("utf-8", "replace")
+
+
+def summary(limit=50):
+    """Shapes from the log files (all workers), slowest total time first."""
+    return _summaries.get_or_set(limit, lambda: _summarize(limit))
+
+
+def _summarize(limit):
+    shapes = {}
+    for path in _log_paths():
+        try:
+            lines = list(_tail_lines(path))
+        except FileNotFoundError:
+            continue
+        for line in lines:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a rotation
+            s = shapes.get(e["sql"])
+            if s is None:
+                s = shapes[e["sql"]] = {"sql": e["sql"], "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                        "endpoints": Counter(), "params": e["params"],
+                                        "plan": None, "plan_at": "", "last_at": ""}
+            s["count"] += 1
+            s["total_ms"] += e["ms"]
+            s["max_ms"] = max(s["max_ms"], e["ms"])
+            s["endpoints"][e["endpoint"]] += 1
+            s["last_at"] = max(s["last_at"], e["at"])
+            if e.get("plan") and e["at"] >= s["plan_at"]:
+                s["plan"], s["plan_at"] = e["plan"], e["at"]
+    ranked = sorted(shapes.values(), key=lambda s: s["total_ms"], reverse=True)[:limit]
+    for s in ranked:
+        s["avg_ms"] = s["total_ms"] / s["count"]
+        s["endpoints"] = s["endpoints"].most_common(3)
+    return ranked
@@ -0,0 +1,138 @@
+"""Per-request SQL and template timings, sent back as ``Server-Timing``.
+
+Engine events count every statement a request runs and add up the time
+spent in the driver; Flask's template signals do the same for rendering.
+The totals go out on each response, e.g.
+
+    Server-Timing: db;dur=4.1;desc="6 queries", tpl;dur=7.9, app;dur=15.3
+
+which browser dev tools show under the request's Timing tab. The header
+gives away per-route DB time and query counts, so by default only admins
+get it. A statement
+that runs more than ``SQL_N_PLUS_ONE`` times in one request -- the usual
+sign of a lazy load inside a loop -- is logged as a warning with the
+endpoint. Work outside a request (CLI, worker, pool callbacks) isn't
+counted. The bookkeeping is a couple of ``perf_counter()`` calls and a dict
+update per statement, cheap enough to leave on.
+
+``tpl`` includes any queries a template triggers while rendering.
+
+Config:
+    SERVER_TIMING    who gets the header: "admin" (default), "all" (local
+                     debugging) or "" for nobody
+    SQL_N_PLUS_ONE   repeats of one statement before warning (default 10)
+"""
+import logging
+import time
+from collections import Counter
+
+from flask import before_render_template, current_app, g, has_request_context, request, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+log = logging.getLogger(__name__)
+
+
+class RequestStats:
+    __slots__ = ("started", "queries", "db_time", "render_time", "render_depth",
+                 "render_started", "statements")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.render_depth = 0
+        self.render_started = 0.0
+        self.statements = Counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def repeated(self, threshold):
+        """Statements run more than ``threshold`` times, most repeated first."""
+        return [(sql, n) for sql, n in self.statements.most_common() if n > threshold]
+
+
+def current():
+    """This request's ``RequestStats``, or ``None`` outside a request."""
+    return g.get("_sql_timing") if has_request_context() else None
+
+
+def init_app(app):
+    app.config.setdefault("SERVER_TIMING", "admin")
+    app.config.setdefault("SQL_N_PLUS_ONE", 10)
+    app.before_request(_start)
+    app.after_request(_finish)
+    before_render_template.connect(_render_start, app)
+    template_rendered.connect(_render_end, app)
+
+
+def _start():
+    g._sql_timing = RequestStats()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_sql_timing_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["_sql_timing_start"].pop()
+    stats = current()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+        stats.statements[statement] += 1
+
+
+@event.listens_for(Engine, "handle_error")
+def _failed(exception_context):
+    # after_cursor_execute never comes for a failed statement
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("_sql_timing_start"):
+        conn.info["_sql_timing_start"].pop()
+
+
+def _render_start(sender, template, context, **extra):
+    stats = current()
+    if stats is not None:
+        if not stats.render_depth:
+            stats.render_started = time.perf_counter()
+        stats.render_depth += 1
+
+
+def _render_end(sender, template, context, **extra):
+    stats = current()
+    if stats is not None and stats.render_depth:
+        stats.render_depth -= 1
+        if not stats.render_depth:
+            stats.render_time += time.perf_counter() - stats.render_started
+
+
+def _send_header(audience):
+    if audience == "all":
+        return True
+    return bool(audience) and current_user.is_authenticated and getattr(current_user, "role", "") == "admin"
+
+
+def _finish(response):
+    stats = current()
+    if stats is None:
+        return response
+
+    cfg = current_app.config
+    for sql, n in stats.repeated(cfg["SQL_N_PLUS_ONE"]):
+        log.warning("possible N+1: %d x %r in %s %s", n, " ".join(sql.split())[:200],
+                    request.method, request.endpoint)
+    if _send_header(cfg["SERVER_TIMING"]):
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+            f"tpl;dur={stats.render_time * 1000:.1f}, app;dur={stats.elapsed * 1000:.1f}",
+        )
+    return response
@@ -0,0 +1,79 @@
+"""Shared fixtures: the app on a throwaway database built by the migrations.
+
+The migrations start from the schema of the shipped ``instance/projects.db``
+(the early tables predate Alembic), so the fixture copies that file and
+runs ``flask db upgrade`` on the copy, then adds a small catalogue.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix="re-marketplace-tests-")
+
+# app.py reads these at import time
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP, 'test.db')}"
+os.environ["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"  # fast hashes
+os.environ["SLOW_QUERY_MS"] = "0"
+os.environ["PROFILE_SAMPLE_RATE"] = "0"
+sys.path.insert(0, ROOT)
+
+import flask_migrate  # noqa: E402
+
+from app import app as flask_app  # noqa: E402
+from models import db, Project, User  # noqa: E402
+
+
+def _seed():
+    users = {}
+    for role in ("admin", "developer", "investor"):
+        user = User(email=f"{role}@tests.example", role=role, is_verified=True)
+        user.set_password("password1")
+        db.session.add(user)
+        users[role] = user
+    db.session.flush()
+    for i in range(30):
+        db.session.add(Project(
+            title=f"Tower {i}", description=f"Office tower number {i}", budget=10, funding=5 + i % 10,
+            irr=8 + i % 10, location=["UK", "France", "Spain"][i % 3], sponsor_equity=10,
+            user_id=users["developer"].id, project_type="commercial",
+            location_type="prime" if i % 2 else "non-prime", risk_level=1 + i % 10))
+    db.session.commit()
+
+
+@pytest.fixture(scope="session")
+def app():
+    shutil.copy(os.path.join(ROOT, "instance", "projects.db"), os.path.join(TMP, "test.db"))
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, SERVER_TIMING=False,
+                            UPLOAD_FOLDER=os.path.join(TMP, "uploads"))
+    with flask_app.app_context():
+        flask_migrate.upgrade(directory=os.path.join(ROOT, "migrations"))
+        _seed()
+        db.session.remove()
+    yield flask_app
+    shutil.rmtree(TMP, ignore_errors=True)
+
+
+@pytest.fixture
+def ctx(app):
+    """An app context whose session is rolled back afterwards."""
+    with app.app_context():
+        yield
+        db.session.rollback()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, email):
+    """Log ``client`` in as the user with ``email`` without going through the form."""
+    with flask_app.app_context():
+        user_id = db.session.scalar(db.select(User.id).where(User.email == email))
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
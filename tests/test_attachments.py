@@ -0,0 +1,74 @@
+import io
+import os
+import time
+
+import attachments
+from models import db, AttachmentBlob
+
+
+def _store(content, name="plan.pdf"):
+    return attachments.store(attachments._LocalFile(io.BytesIO(content), name))
+
+
+def _age(key, seconds):
+    old = time.time() - seconds
+    os.utime(attachments.path_for(key), (old, old))
+
+
+def test_identical_content_is_stored_once(ctx):
+    first = _store(b"same bytes", "a.pdf")
+    second = _store(b"same bytes", "b.pdf")
+    assert first == second and attachments.is_content_key(first)
+    assert os.listdir(os.path.dirname(attachments.path_for(first))) == [os.path.basename(first)]
+
+
+def test_dedup_hit_restarts_the_gc_grace_period(ctx):
+    key = _store(b"uploaded long ago")
+    _age(key, attachments.GC_GRACE_SECONDS * 2)
+    assert _store(b"uploaded long ago") == key
+    assert os.path.getmtime(attachments.path_for(key)) > time.time() - 60
+
+
+def test_retain_counts_every_reference(ctx):
+    key = _store(b"shared by two projects")
+    attachments.retain(key)
+    attachments.retain(key)
+    db.session.commit()
+    assert db.session.get(AttachmentBlob, key).refcount == 2
+
+    attachments.release(key)
+    db.session.commit()
+    db.session.expire_all()
+    assert db.session.get(AttachmentBlob, key).refcount == 1
+
+
+def test_gc_removes_only_old_unreferenced_blobs(ctx):
+    kept, fresh, dead = _store(b"kept"), _store(b"fresh"), _store(b"dead")
+    for key in (kept, fresh, dead):
+        attachments.retain(key)
+    db.session.commit()
+    for key in (fresh, dead):
+        attachments.release(key)
+    db.session.commit()
+    _age(kept, attachments.GC_GRACE_SECONDS * 2)
+    _age(dead, attachments.GC_GRACE_SECONDS * 2)
+
+    assert dead in attachments.gc(dry_run=True)
+    removed = attachments.gc()
+    assert dead in removed and kept not in removed and fresh not in removed
+    assert not os.path.exists(attachments.path_for(dead))
+    assert os.path.exists(attachments.path_for(kept)) and os.path.exists(attachments.path_for(fresh))
+    assert db.session.get(AttachmentBlob, dead) is None
+
+
+def test_offloaded_range_request_is_a_plain_200(app, ctx, client):
+    key = _store(b"0123456789" * 100)
+    previous = app.config.get("ATTACHMENT_SENDFILE")
+    app.config["ATTACHMENT_SENDFILE"] = "x-accel"
+    try:
+        r = client.get(f"/uploads/{key}", headers={"Range": "bytes=0-99"})
+        assert r.status_code == 200 and "Content-Range" not in r.headers
+        assert r.headers["X-Accel-Redirect"].endswith(key)
+        r.close()
+    finally:
+        app.config["ATTACHMENT_SENDFILE"] = previous
@@ -0,0 +1,17 @@
+from conftest import login
+from models import db, NDARequest, Project, User
+
+
+def test_recent_nda_requests_have_an_empty_phone_cell(app, client):
+    with app.app_context():
+        investor = db.session.scalar(db.select(User).where(User.email == "investor@tests.example"))
+        project = db.session.scalar(db.select(Project).limit(1))
+        db.session.add(NDARequest(user_id=investor.id, project_id=project.id, company="Test Capital", contact_name="Dana Test",
+                                  contact_email="dana@tests.example"))
+        db.session.commit()
+
+    login(client, "admin@tests.example")
+    page = client.get("/admin-dashboard").get_data(as_text=True)
+    nda_table = page[page.index("Recent NDA Requests"):]
+    assert "Dana Test" in nda_table
+    assert "<td>None</td>" not in nda_table
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import delete, select
+
+import jobs
+from models import db, Job, utcnow
+
+
+@pytest.fixture
+def queue(ctx):
+    calls = []
+
+    @jobs.handler("test.ok")
+    def ok(payload):
+        calls.append(payload)
+
+    @jobs.handler("test.boom")
+    def boom(payload):
+        raise RuntimeError("boom")
+
+    yield calls
+    db.session.rollback()
+    db.session.execute(delete(Job).where(Job.kind.like("test.%")))
+    db.session.commit()
+
+
+def test_claimed_jobs_are_not_claimed_again(queue):
+    for i in range(3):
+        jobs.enqueue("test.ok", {"n": i})
+    db.session.commit()
+
+    first = jobs.claim(batch=2, worker="a")
+    second = jobs.claim(batch=10, worker="b")
+    assert len(first) == 2 and len(second) == 1
+    assert not set(first) & set(second)
+    assert jobs.claim(worker="c") == []
+
+
+def test_expired_lease_is_reclaimed(queue):
+    jobs.enqueue("test.ok")
+    db.session.commit()
+    (job_id,) = jobs.claim(worker="dead")
+    db.session.get(Job, job_id).locked_at = utcnow() - timedelta(seconds=jobs.LEASE_SECONDS + 1)
+    db.session.commit()
+
+    assert jobs.claim(worker="alive") == [job_id]
+    job = db.session.get(Job, job_id)
+    assert job.locked_by == "alive" and job.attempts == 2
+
+
+def test_expired_lease_on_last_attempt_fails_the_job(queue):
+    jobs.enqueue("test.ok", max_attempts=1)
+    db.session.commit()
+    (job_id,) = jobs.claim(worker="dead")
+    db.session.get(Job, job_id).locked_at = utcnow() - timedelta(seconds=jobs.LEASE_SECONDS + 1)
+    db.session.commit()
+
+    assert jobs.claim(worker="alive") == []
+    job = db.session.get(Job, job_id)
+    db.session.refresh(job)
+    assert job.status == "failed" and job.attempts == 1 and job.finished_at is not None
+    assert job.locked_by is None and "lease expired" in job.last_error
+
+
+def test_idempotency_key_drops_duplicates(queue):
+    jobs.enqueue("test.ok", key="test:once")
+    jobs.enqueue("test.ok", key="test:once")
+    db.session.commit()
+    assert len(db.session.scalars(select(Job).where(Job.idempotency_key == "test:once")).all()) == 1
+
+
+def test_success_and_retry_then_failure(queue):
+    jobs.enqueue("test.ok", {"n": 1})
+    jobs.enqueue("test.boom", max_attempts=2)
+    db.session.commit()
+
+    ok_id, boom_id = sorted(jobs.claim())
+    assert jobs.run(ok_id) == "done" and queue == [{"n": 1}]
+    assert jobs.run(boom_id) == "queued"
+    job = db.session.get(Job, boom_id)
+    assert job.run_at > utcnow() and "boom" in job.last_error and job.locked_by is None
+
+    job.run_at = utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert jobs.claim() == [boom_id]
+    assert jobs.run(boom_id) == "failed"
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import listing
+import search_index
+from models import db, Project
+
+
+def _walk(size, query=None):
+    ids, after = [], None
+    while True:
+        rows, after = listing.page(query or Project.query, after, size)
+        ids.extend(row.id for row in rows)
+        if after is None:
+            return ids
+
+
+def test_pages_cover_every_project_once_newest_first(ctx):
+    all_ids = sorted(db.session.scalars(db.select(Project.id)), reverse=True)
+    for size in (1, 7, len(all_ids), len(all_ids) + 5):
+        assert _walk(size) == all_ids
+
+
+def test_new_rows_do_not_shift_later_pages(ctx):
+    first, after = listing.page(Project.query, None, 5)
+    db.session.add(Project(title="Inserted meanwhile", description="x", budget=1, funding=1, irr=10,
+                           location="UK", sponsor_equity=1, user_id=first[0].user_id))
+    db.session.flush()
+    second, _ = listing.page(Project.query, after, 5)
+    assert second[0].id < first[-1].id
+    assert "Inserted meanwhile" not in {row.title for row in second}
+
+
+def test_filtered_pages_respect_the_filter(ctx):
+    query = Project.query.filter(Project.irr >= 15)
+    expected = sorted(db.session.scalars(db.select(Project.id).where(Project.irr >= 15)), reverse=True)
+    assert expected and _walk(3, query) == expected
+
+
+def test_cursor_round_trip_and_junk():
+    assert listing.decode_cursor(listing.encode_cursor(SimpleNamespace(id=42))) == (None, 42)
+    assert listing.decode_cursor(listing.encode_cursor(snapshot=90, offset=20), ranked=True) == (90, 20)
+    for junk in ("", None, "abc", "1.5:x", "-1:0", "5:-20"):
+        assert listing.decode_cursor(junk, ranked=True) is None
+    assert listing.decode_cursor("abc") is None
+
+
+def _keyword_page(text, after, size):
+    hits = search_index.match(text)
+    query = Project.query.join(hits, hits.c.project_id == Project.id)
+    return listing.page(query, after, size, rank=hits.c.rank)
+
+
+def test_ranked_pages_survive_a_matching_insert(ctx):
+    expected = [row.id for row in _keyword_page("tower", None, 1000)[0]]
+    first, after = _keyword_page("tower", None, 7)
+
+    # a new match changes every row's bm25 score
+    db.session.add(Project(title="Tower tower tower", description="Brand new tower", budget=1, funding=1,
+                           irr=10, location="UK", sponsor_equity=1, user_id=first[0].user_id))
+    db.session.flush()
+
+    seen = [row.id for row in first]
+    while after:
+        rows, after = _keyword_page("tower", after, 7)
+        seen.extend(row.id for row in rows)
+    assert len(seen) == len(set(seen))  # no repeats
+    assert sorted(seen) == sorted(expected)  # no gaps, and the newcomer waits for a fresh search
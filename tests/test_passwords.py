@@ -0,0 +1,46 @@
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+
+import passwords
+from models import User
+
+
+@pytest.fixture
+def configure(app):
+    def set_method(method):
+        other = Flask(__name__)
+        other.config["PASSWORD_HASH_METHOD"] = method
+        passwords.init_app(other)
+    yield set_method
+    passwords.init_app(app)
+
+
+@pytest.mark.parametrize("short, stored", [
+    ("scrypt", "scrypt:32768:8:1"),
+    ("pbkdf2:sha256", "pbkdf2:sha256:600000"),
+    ("pbkdf2:sha256:1000", "pbkdf2:sha256:1000"),
+])
+def test_short_method_names_are_expanded(configure, short, stored):
+    configure(short)
+    assert passwords._method == stored
+    assert not passwords.needs_rehash(generate_password_hash("pw", short))
+
+
+def test_stale_hash_is_upgraded_on_login(configure):
+    configure("pbkdf2:sha256:1000")
+    user = User(email="rehash@tests.example", password_hash=generate_password_hash("pw", "pbkdf2:sha256:1"))
+    assert passwords.verify(user, "pw")
+    assert user.password_hash.startswith("pbkdf2:sha256:1000$")
+
+    upgraded = user.password_hash
+    assert passwords.verify(user, "pw")
+    assert user.password_hash == upgraded  # current hashes are left alone
+
+
+def test_wrong_password_is_not_rehashed(configure):
+    configure("pbkdf2:sha256:1000")
+    stale = generate_password_hash("pw", "pbkdf2:sha256:1")
+    user = User(email="wrong@tests.example", password_hash=stale)
+    assert not passwords.verify(user, "nope")
+    assert user.password_hash == stale
@@ -0,0 +1,18 @@
+import query_plans
+
+
+def test_no_full_scans_of_hot_tables(app):
+    with app.app_context():
+        problems = query_plans.check(app)
+    report = "\n\n".join(f"{sql}\n  plan: {plan}\n  ran for: {where[:3]}" for sql, plan, where in problems)
+    assert not problems, report
+
+
+def test_unindexed_filter_is_reported(ctx):
+    found = query_plans.scans("SELECT project.id FROM project WHERE project.title = ?", ("x",))
+    assert found and found[0].startswith("SCAN project")
+
+
+def test_keyset_walk_and_whole_table_reads_are_fine(ctx):
+    assert not query_plans.scans("SELECT project.id FROM project WHERE project.id < ? LIMIT 20", (100,))
+    assert not query_plans.scans("SELECT project.id, project.title FROM project", ())
@@ -0,0 +1,34 @@
+import pytest
+
+from conftest import login
+
+
+@pytest.fixture
+def audience(app):
+    previous = app.config["SERVER_TIMING"]
+
+    def set_audience(value):
+        app.config["SERVER_TIMING"] = value
+    yield set_audience
+    app.config["SERVER_TIMING"] = previous
+
+
+def test_header_only_for_admins_by_default(audience, client):
+    audience("admin")
+    assert "Server-Timing" not in client.get("/about").headers
+
+    login(client, "investor@tests.example")
+    assert "Server-Timing" not in client.get("/about").headers
+
+    login(client, "admin@tests.example")
+    header = client.get("/search").headers["Server-Timing"]
+    assert header.startswith("db;dur=") and "queries" in header and "app;dur=" in header
+
+
+def test_header_for_everyone_or_nobody(audience, client):
+    audience("all")
+    assert "Server-Timing" in client.get("/about").headers
+
+    audience("")
+    login(client, "admin@tests.example")
+    assert "Server-Timing" not in client.get("/search").headers
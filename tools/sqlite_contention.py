@@ -0,0 +1,107 @@
+"""Read throughput while writes are happening, SQLite defaults vs db_engine.
+
+Run from the repo root:
+
+    python tools/sqlite_contention.py --readers 4 --writers 2 --seconds 5
+
+Each mode gets a fresh scratch database (never instance/projects.db) seeded
+with project-like rows. Reader processes page through it like the search
+listing does while writer processes insert callback-request-like rows in
+short transactions -- roughly what several gunicorn workers do.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_engine  # noqa: E402
+
+
+def _connect(path, tuned):
+    conn = sqlite3.connect(path)  # pysqlite's own 5 s busy wait either way
+    if tuned:
+        db_engine.apply(conn, db_engine.pragmas({}))
+    return conn
+
+
+def _seed(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE project (id INTEGER PRIMARY KEY, title TEXT, location TEXT, irr REAL);
+        CREATE TABLE callback_request (id INTEGER PRIMARY KEY, name TEXT, phone TEXT, timestamp REAL);
+    """)
+    conn.executemany("INSERT INTO project (title, location, irr) VALUES (?, ?, ?)",
+                     ((f"Project {i}", f"City {i % 50}", i % 30) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def _reader(path, tuned, stop, out):
+    conn = _connect(path, tuned)
+    reads = errors = 0
+    while time.time() < stop:
+        try:
+            conn.execute("SELECT id, title, location, irr FROM project WHERE irr >= ? "
+                         "ORDER BY id DESC LIMIT 20", (reads % 30,)).fetchall()
+            conn.execute("SELECT count(*) FROM callback_request").fetchone()
+            reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    out.put(("read", reads, errors))
+
+
+def _writer(path, tuned, stop, out):
+    conn = _connect(path, tuned)
+    writes = errors = 0
+    while time.time() < stop:
+        try:
+            with conn:
+                conn.execute("INSERT INTO callback_request (name, phone, timestamp) VALUES (?, ?, ?)",
+                             ("bench", "000", time.time()))
+            writes += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    out.put(("write", writes, errors))
+
+
+def run(tuned, readers, writers, seconds, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _seed(path, rows)
+        out = mp.Queue()
+        stop = time.time() + 0.5 + seconds
+        procs = [mp.Process(target=_reader, args=(path, tuned, stop, out)) for _ in range(readers)]
+        procs += [mp.Process(target=_writer, args=(path, tuned, stop, out)) for _ in range(writers)]
+        for p in procs:
+            p.start()
+        totals = {"read": [0, 0], "write": [0, 0]}
+        for _ in procs:
+            kind, done, errors = out.get(timeout=seconds + 60)
+            totals[kind][0] += done
+            totals[kind][1] += errors
+        for p in procs:
+            p.join()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    for label, tuned in (("defaults", False), ("db_engine", True)):
+        t = run(tuned, args.readers, args.writers, args.seconds, args.rows)
+        print(f"{label:>10}: {t['read'][0] / args.seconds:9.0f} reads/s ({t['read'][1]} locked), "
+              f"{t['write'][0] / args.seconds:7.0f} writes/s ({t['write'][1]} locked)")
+
+
+if __name__ == "__main__":
+    main()
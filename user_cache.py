@@ -0,0 +1,90 @@
+"""Cached, compact ``current_user`` for Flask-Login.
+
+``load_user`` runs on nearly every request (the investor verification gate
+touches ``current_user`` even on /about and /faq). Instead of a DB hit each
+time it returns a ``CurrentUser`` built from a small cached snapshot (id,
+role, is_verified, email, display name). Anything outside the snapshot --
+other columns, methods, attribute writes -- transparently loads the full
+``User`` row once for that request.
+
+Call ``invalidate(user_id)`` after changing a user (profile, registration,
+Flask-Admin) so every worker drops that user's stale snapshot;
+``invalidate()`` with no id drops them all.
+"""
+from flask_login import UserMixin
+
+from cache import TTLCache
+from models import db, User
+
+
+TTL_SECONDS = 120
+
+_cache = TTLCache("users", ttl=TTL_SECONDS, maxsize=4096, key_stamps=True)
+
+SNAPSHOT_FIELDS = ("id", "role", "is_verified", "email", "display_name")
+
+
+def _display_name(user):
+    full = f"{user.first_name or ''} {user.surname or ''}".strip()
+    return full or user.email
+
+
+def _snapshot(user_id):
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    return {
+        "id": user.id,
+        "role": user.role,
+        "is_verified": bool(user.is_verified),
+        "email": user.email,
+        "display_name": _display_name(user),
+    }
+
+
+class CurrentUser(UserMixin):
+    def __init__(self, snapshot):
+        for name in SNAPSHOT_FIELDS:
+            object.__setattr__(self, name, snapshot[name])
+        object.__setattr__(self, "_row", None)
+
+    def _user(self):
+        # the full row, loaded at most once per request
+        if self._row is None:
+            object.__setattr__(self, "_row", db.session.get(User, self.id))
+        return self._row
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self._user(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._user(), name, value)
+        if name in SNAPSHOT_FIELDS:
+            object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return f"<CurrentUser {self.email}>"
+
+
+def load(user_id):
+    """``user_loader`` callback: a ``CurrentUser`` or ``None``."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    snap = _cache.get(user_id)
+    if snap is None:
+        snap = _snapshot(user_id)
+        if snap is None:
+            return None
+        _cache.set(user_id, snap)
+    return CurrentUser(snap)
+
+
+def invalidate(user_id=None):
+    if user_id is None:
+        _cache.clear()
+    else:
+        _cache.discard(int(user_id))